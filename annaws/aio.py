@@ -0,0 +1,191 @@
+import asyncio, click, random
+from types import SimpleNamespace
+from botocore.exceptions import ClientError
+from . import globals as g
+from .globals import AdaptiveBackoff, THROTTLE_CODES
+
+# ------------------------------------------------------------- Async engine -------------------------------------------------------------
+# optional asyncio backend for the high fan-out helpers (--engine async, pip install annaws[async]).
+# same contracts as the thread pool versions in s3.py/route53.py: the commands stay sync and each
+# helper runs one event loop with aiobotocore clients, a semaphore bounding the calls in flight
+
+def enabled():
+    return g.SETTINGS["engine"] == "async"
+
+def _limit(workers): # calls in flight: --workers/--concurrency, else the http pool size
+    return max(1, workers or max(g.SETTINGS["max_pool_connections"], g.max_workers()))
+
+def _session():
+    try:
+        from aiobotocore.session import AioSession
+    except ImportError:
+        raise click.ClickException("--engine async needs aiobotocore: pip install annaws[async]")
+    session = AioSession(profile=g.SETTINGS["profile"])
+    events = SimpleNamespace(events=session.get_component("event_emitter"))
+    for hook in g.session_hooks(): # --trace records the async calls too
+        hook(events)
+    return session
+
+def _client(session, service):
+    from aiobotocore.config import AioConfig
+    return session.create_client(
+        service,
+        region_name=g.get_region(),
+        endpoint_url=g.SETTINGS["endpoints"].get(service),
+        config=g.client_config(AioConfig)
+    )
+
+# AdaptiveBackoff.call for coroutines: same shared delay, slept on the event loop
+async def _call(backoff, method, **kwargs):
+    for attempt in range(backoff.max_retries + 1):
+        if backoff.delay:
+            await asyncio.sleep(random.uniform(0, backoff.delay)) # jitter, as AdaptiveBackoff.wait
+        try:
+            result = await method(**kwargs)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in THROTTLE_CODES or attempt == backoff.max_retries:
+                raise
+            backoff.throttled()
+            continue
+        backoff.succeeded()
+        return result
+
+# ------------------------------------------------------------- S3 -------------------------------------------------------------
+
+async def _annaws_bucket_names(names, limit):
+    semaphore = asyncio.Semaphore(limit)
+    backoff = AdaptiveBackoff()
+    async with _client(_session(), "s3") as s3:
+        async def tags(name):
+            async with semaphore:
+                try:
+                    response = await _call(backoff, s3.get_bucket_tagging, Bucket=name)
+                except ClientError:
+                    return None
+            return {tag["Key"]: tag["Value"] for tag in response["TagSet"]}
+        all_tags = await asyncio.gather(*(tags(name) for name in names))
+    return [name for name, tags in zip(names, all_tags) if tags and tags.get("CreatedBy") == "annaws-cli"]
+
+# names of the annaws-cli buckets among names, in the same order (see s3.anna_s3_buckets)
+def annaws_bucket_names(names, workers=None):
+    return asyncio.run(_annaws_bucket_names(list(names), _limit(workers)))
+
+class _Upload:
+    """Stands in for the s3transfer future TransferStats reads (result() and meta.call_args.key)"""
+    def __init__(self, key):
+        self.meta = SimpleNamespace(call_args=SimpleNamespace(key=key))
+        self.error = None
+
+    def result(self):
+        if self.error:
+            raise self.error
+
+def _read(path, offset, size):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+async def _upload_file(s3, semaphore, bucket, local_path, key, size, config, stats, extra_args):
+    from s3transfer.utils import ChunksizeAdjuster
+    upload = _Upload(key)
+    stats.on_queued(upload)
+    try:
+        if size < config.multipart_threshold:
+            async with semaphore: # file read only once it may be sent
+                stats.on_progress(upload, 0) # starts its latency clock, as s3transfer's first read does
+                body = await asyncio.to_thread(_read, local_path, 0, size)
+                await s3.put_object(Bucket=bucket, Key=key, Body=body, **extra_args)
+            stats.on_progress(upload, len(body))
+        else:
+            part_size = ChunksizeAdjuster().adjust_chunksize(config.multipart_chunksize, size) # same parts as s3transfer
+            async with semaphore:
+                stats.on_progress(upload, 0)
+                upload_id = (await s3.create_multipart_upload(Bucket=bucket, Key=key, **extra_args))["UploadId"]
+
+            async def part(number, offset):
+                async with semaphore:
+                    data = await asyncio.to_thread(_read, local_path, offset, part_size)
+                    response = await s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=data)
+                stats.on_progress(upload, len(data))
+                return {"PartNumber": number, "ETag": response["ETag"]}
+
+            try:
+                parts = await asyncio.gather(*(part(number, offset) for number, offset in
+                                               enumerate(range(0, size, part_size), start=1)))
+                async with semaphore:
+                    await s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                                       MultipartUpload={"Parts": list(parts)})
+            except Exception:
+                await s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+                raise
+    except Exception as e:
+        upload.error = e
+    stats.on_done(upload)
+
+async def _upload_stream(items, bucket, config, stats, extra_args):
+    semaphore = asyncio.Semaphore(config.max_concurrency)
+    async with _client(_session(), "s3") as s3:
+        tasks = set()
+        for local_path, key, size in items:
+            tasks.add(asyncio.create_task(_upload_file(s3, semaphore, bucket, local_path, key, size, config, stats, extra_args)))
+            if len(tasks) >= config.max_concurrency * 4: # keep reading the file list without queueing all of it
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if tasks:
+            await asyncio.wait(tasks)
+    return stats
+
+# s3.upload_stream on the event loop: small files and parts of big ones share config.max_concurrency requests
+def upload_stream(items, bucket, config, stats, extra_args):
+    return asyncio.run(_upload_stream(items, bucket, config, stats, extra_args))
+
+# ------------------------------------------------------------- Route53 -------------------------------------------------------------
+
+async def _zones_tags(id_batches, limit):
+    semaphore = asyncio.Semaphore(limit)
+    backoff = AdaptiveBackoff() # route53 allows few requests per second, every call slows down together
+    async with _client(_session(), "route53") as route53:
+        async def tags(zone_ids):
+            async with semaphore:
+                response = await _call(backoff, route53.list_tags_for_resources, ResourceType="hostedzone", ResourceIds=zone_ids)
+            return {
+                tag_set["ResourceId"]: {t["Key"]: t["Value"] for t in tag_set.get("Tags", [])}
+                for tag_set in response["ResourceTagSets"]
+            }
+        async def tags_or_each(zone_ids): # as route53.zones_tags_or_each: a failing batch is asked zone by zone
+            try:
+                return await tags(zone_ids)
+            except ClientError:
+                found = {}
+                for zone_id in zone_ids:
+                    try:
+                        found.update(await tags([zone_id]))
+                    except ClientError:
+                        pass
+                return found
+        return await asyncio.gather(*(tags_or_each(zone_ids) for zone_ids in id_batches))
+
+# route53.zones_tags_or_each for every batch of (up to 10) zone ids, results in batch order
+def zones_tags(id_batches, workers=None):
+    return asyncio.run(_zones_tags(id_batches, _limit(workers)))
+
+async def _record_sets(queries, limit):
+    from .route53 import record_query, page_records, next_page_query
+    semaphore = asyncio.Semaphore(limit)
+    backoff = AdaptiveBackoff()
+    async with _client(_session(), "route53") as route53:
+        async def zone_records(zone_id, subtree, record_type): # pages of one zone follow each other
+            kwargs, stop_key = record_query(zone_id, subtree)
+            records = []
+            while True:
+                async with semaphore:
+                    page = await _call(backoff, route53.list_resource_record_sets, **kwargs)
+                found, finished = page_records(page, subtree, record_type, stop_key)
+                records.extend(found)
+                if finished:
+                    return records
+                next_page_query(kwargs, page)
+        return await asyncio.gather(*(zone_records(*query) for query in queries))
+
+# record sets of every (zone_id, subtree, record_type) query, all zones at once: one list per query, in order
+def record_sets(queries, workers=None):
+    return asyncio.run(_record_sets(queries, _limit(workers)))
@@ -0,0 +1,88 @@
+import atexit, json, os, tempfile, threading, time
+
+# ------------------------------------------------------------- Local cache -------------------------------------------------------------
+# small json cache for slow-changing lookups (caller identity, SSM AMI ids), kept in ~/.annaws/cache.json.
+# entries expire after their TTL and the least recently used ones are dropped past MAX_ENTRIES
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".annaws")
+CACHE_FILE = os.path.join(CACHE_DIR, "cache.json")
+MAX_ENTRIES = 256
+
+IDENTITY_TTL = 7 * 24 * 3600 # identity of a profile almost never changes
+AMI_TTL = 24 * 3600          # SSM "latest" AMI parameters change weekly at most
+
+_settings = {"enabled": True, "refresh": False, "ttl": None}
+_entries = None
+_dirty = False
+_lock = threading.Lock()
+
+# set from the root cli options (--no-cache, --refresh, --cache-ttl)
+def configure(enabled=True, refresh=False, ttl=None):
+    _settings.update(enabled=enabled, refresh=refresh, ttl=ttl)
+
+# atomic write: temp file in the same directory, then rename over the old file
+def write_json_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(CACHE_FILE, encoding="utf-8") as f:
+                _entries = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError): # missing or corrupted file -> start empty
+            _entries = {}
+    return _entries
+
+def _save():
+    global _dirty
+    now = time.time()
+    entries = {k: v for k, v in _entries.items() if v["expires"] > now}
+    if len(entries) > MAX_ENTRIES: # evict least recently used
+        keep = sorted(entries, key=lambda k: entries[k]["used"], reverse=True)[:MAX_ENTRIES]
+        entries = {k: entries[k] for k in keep}
+    _entries.clear()
+    _entries.update(entries)
+
+    try:
+        write_json_atomic(CACHE_FILE, {"entries": entries})
+        _dirty = False
+    except OSError: # read-only home etc. - caching is best effort
+        pass
+
+@atexit.register
+def _flush():
+    with _lock:
+        if _dirty and _entries is not None:
+            _save()
+
+# return the cached value for key, or compute it, store it for ttl seconds and return it
+def cached(key_parts, compute, ttl):
+    global _dirty
+    if not _settings["enabled"]:
+        return compute()
+    key = "|".join(str(part) for part in key_parts)
+    now = time.time()
+    with _lock:
+        entry = _load().get(key)
+        if entry and entry["expires"] > now and not _settings["refresh"]:
+            entry["used"] = now
+            _dirty = True # recency is written once at exit
+            return entry["value"]
+
+    value = compute()
+    if _settings["ttl"] is not None:
+        ttl = _settings["ttl"]
+    with _lock:
+        _load()[key] = {"value": value, "expires": now + ttl, "used": now}
+        _save()
+    return value
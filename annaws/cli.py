@@ -1,15 +1,53 @@
 import click
+from . import cache, globals, inventory
+from .trace import CallRecorder
 from .ec2 import ec2
 from .s3 import s3
 from .route53 import route53
+from .inventory import inventory as inventory_group
+from .destroy import destroy
+from .jobs import jobs
 
 @click.group()
-def cli():
+@click.option("--profile", default=None, help="AWS profile to use (default: AWS_PROFILE / default)")
+@click.option("--region", default=None, help="AWS region to use (default: from the profile)")
+@click.option("--max-workers", type=click.IntRange(1, 512), default=None, help="Threads for parallel calls, the http pool grows to match (default 16)")
+@click.option("--engine", type=click.Choice(["sync", "async"]), default=None,
+              help="Run scans and uploads on thread pools or an asyncio event loop (async needs: pip install annaws[async])")
+@click.option("--config", "config_file", type=click.Path(dir_okay=False), default=globals.CONFIG_FILE, envvar="ANNAWS_CONFIG",
+              show_default=True, help="Settings file (profile, region, http pool, retries, timeouts, endpoints)")
+@click.option("--no-cache", is_flag=True, help="Don't read or write the local cache (~/.annaws/cache.json)")
+@click.option("--refresh", is_flag=True, help="Ignore cached values and fetch them again (the cache is updated)")
+@click.option("--fresh", is_flag=True, help="Rescan AWS instead of answering from the local inventory (~/.annaws/inventory.db)")
+@click.option("--cache-ttl", type=int, default=None, help="Seconds new cache entries stay valid (default: 7 days identity, 1 day AMI ids)")
+@click.option("--trace", "--profile-calls", "trace", is_flag=True, help="Print every AWS operation's count, latency, retries and bytes at exit (stderr)")
+@click.option("--trace-file", type=click.Path(dir_okay=False, writable=True), default=None, help="Also write the calls as a Chrome trace (chrome://tracing, ui.perfetto.dev)")
+@click.pass_context
+def cli(ctx, profile, region, max_workers, engine, config_file, no_cache, refresh, fresh, cache_ttl, trace, trace_file):
     """annaws - AWS CLI tool for creating, manageing and listine EC2, S3 Buckets and Route53"""
+    # config file first, command line options win
+    explicit = ctx.get_parameter_source("config_file") != click.core.ParameterSource.DEFAULT # --config / ANNAWS_CONFIG
+    globals.configure(reset=True, **globals.load_config_file(config_file, must_exist=explicit))
+    globals.configure(profile=profile, region=region, max_workers=max_workers, engine=engine)
+    cache.configure(enabled=not no_cache, refresh=refresh, ttl=cache_ttl)
+    inventory.configure(fresh=fresh)
+
+    if trace or trace_file:
+        recorder = CallRecorder()
+        globals.add_session_hook(recorder.attach)
+        def report():
+            recorder.echo_summary()
+            if trace_file:
+                recorder.write_chrome_trace(trace_file)
+                click.echo(f"Chrome trace written to {trace_file}", err=True)
+        ctx.call_on_close(report)
 
 cli.add_command(ec2)
 cli.add_command(s3)
 cli.add_command(route53)
+cli.add_command(inventory_group)
+cli.add_command(destroy)
+cli.add_command(jobs)
 
 if __name__ == "__main__":
-    cli()
\ No newline at end of file
+    cli()
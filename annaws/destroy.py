@@ -0,0 +1,153 @@
+import click, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from . import globals, inventory
+from .globals import ec2_client, s3_client, route53_client, AdaptiveBackoff, max_workers
+from .trace import CallRecorder
+from .ec2 import iter_instance_records
+from .s3 import scan_buckets
+from .route53 import scan_zones, iter_record_sets, diff_record_sets, pack_changes, submit_change_batches
+
+LIVE_STATES = ["pending", "running", "stopping", "stopped"] # everything not already shutting down / terminated
+
+# ------------------------------------------------------------- Helpers -------------------------------------------------------------
+
+def terminate_instances(instance_ids):
+    terminated = []
+    for start in range(0, len(instance_ids), 1000): # one call, up to 1000 ids each
+        response = ec2_client.terminate_instances(InstanceIds=instance_ids[start:start + 1000])
+        terminated.extend(i["InstanceId"] for i in response["TerminatingInstances"])
+    return terminated
+
+# every record of the zone but the apex SOA/NS (route53 deletes those with the zone), as DELETE changes
+def zone_deletes(zone):
+    return diff_record_sets(list(iter_record_sets(zone["Id"])), [], zone["Name"])
+
+# records first (packed ChangeBatches, zones in parallel), then the empty zones. Returns deleted zones and records
+def delete_zones(zones, workers):
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        deletes = list(pool.map(zone_deletes, zones))
+    batches_by_zone = {zone["Id"]: pack_changes(changes) for zone, changes in zip(zones, deletes) if changes}
+    submitted, errors = submit_change_batches(batches_by_zone, "annaws destroy", workers)
+    for zone_id, error in errors:
+        click.echo(f"  Couldn't delete the records of {zone_id}, zone kept: {error}")
+    failed = {zone_id for zone_id, _ in errors}
+
+    backoff = AdaptiveBackoff() # DeleteHostedZone is throttled like every route53 write
+    def delete_zone(zone):
+        try:
+            backoff.call(route53_client.delete_hosted_zone, Id=zone["Id"])
+            return zone["Id"]
+        except ClientError as e:
+            click.echo(f"  Couldn't delete hosted zone {zone['Name']}: {e}")
+            return None
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        deleted = [zone_id for zone_id in pool.map(delete_zone, [z for z in zones if z["Id"] not in failed]) if zone_id]
+    return deleted, sum(count for _, _, count in submitted)
+
+def delete_batch(bucket, objects, backoff): # one DeleteObjects call, returns (deleted, errors)
+    response = backoff.call(s3_client.delete_objects, Bucket=bucket, Delete={"Objects": objects, "Quiet": True})
+    errors = response.get("Errors", [])
+    return len(objects) - len(errors), errors
+
+# deletes every object version and delete marker (1000 per call) and unfinished multipart upload, then the bucket.
+# pages are listed one after another but their DeleteObjects calls run on delete_pool; slots bounds the queued ones
+def destroy_bucket(bucket, delete_pool, slots):
+    backoff = AdaptiveBackoff() # SlowDown slows every batch of this bucket
+    futures = []
+
+    def submit(objects):
+        for start in range(0, len(objects), 1000):
+            slots.acquire()
+            future = delete_pool.submit(delete_batch, bucket, objects[start:start + 1000], backoff)
+            future.add_done_callback(lambda f: slots.release())
+            futures.append(future)
+
+    # a page is deleted once the next one is listed, so the key the listing continues from still exists
+    previous = []
+    for page in s3_client.get_paginator("list_object_versions").paginate(Bucket=bucket):
+        submit(previous)
+        previous = [{"Key": v["Key"], "VersionId": v["VersionId"]} for v in page.get("Versions", []) + page.get("DeleteMarkers", [])]
+    submit(previous)
+    for page in s3_client.get_paginator("list_multipart_uploads").paginate(Bucket=bucket):
+        for upload in page.get("Uploads", []):
+            s3_client.abort_multipart_upload(Bucket=bucket, Key=upload["Key"], UploadId=upload["UploadId"])
+
+    deleted, errors = 0, []
+    for future in futures:
+        count, batch_errors = future.result()
+        deleted += count
+        errors.extend(batch_errors)
+    if errors:
+        raise click.ClickException(f"{len(errors)} objects of {bucket} couldn't be deleted, first: {errors[0].get('Key')} {errors[0].get('Message')}")
+    backoff.call(s3_client.delete_bucket, Bucket=bucket)
+    return deleted
+
+def destroy_buckets(buckets, workers):
+    deleted, objects = [], 0
+    slots = threading.BoundedSemaphore(workers * 2)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as delete_pool, \
+         ThreadPoolExecutor(max_workers=max(1, min(workers, len(buckets)))) as bucket_pool:
+        futures = {bucket: bucket_pool.submit(destroy_bucket, bucket, delete_pool, slots) for bucket in buckets}
+        for bucket, future in futures.items():
+            try:
+                objects += future.result()
+                deleted.append(bucket)
+            except (ClientError, click.ClickException) as e:
+                click.echo(f"  Couldn't delete bucket {bucket}: {e}")
+    return deleted, objects
+
+# ------------------------------------------------------------- annaws destroy -------------------------------------------------------------
+
+@click.command()
+@click.option("--dry-run", is_flag=True, help="Only show what would be deleted")
+@click.option("--yes", is_flag=True, help="Don't ask for confirmation")
+@click.option("--workers", type=click.IntRange(1, 512), default=None, help="Parallel calls (default: --max-workers)")
+def destroy(dry_run, yes, workers):
+    """Delete every annaws-cli resource: instances (this region), hosted zones and buckets"""
+    workers = workers or max_workers()
+    recorder = CallRecorder()
+    globals.add_session_hook(recorder.attach) # counts every call of this command, discovery included
+    start = time.perf_counter()
+
+    # discovery: the three scans at once (full scans, they also rewrite the inventory)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        instances_future = pool.submit(lambda: [r.id for r in iter_instance_records(LIVE_STATES)])
+        zones_future = pool.submit(lambda: scan_zones(workers=workers)[0])
+        buckets_future = pool.submit(lambda: scan_buckets(workers=workers)[0])
+        instance_ids, zones, buckets = instances_future.result(), zones_future.result(), buckets_future.result()
+
+    if not (instance_ids or zones or buckets):
+        click.echo("No annaws-cli resources found")
+        return
+    # dependency order: instances stop using DNS/buckets first, records before their zone, objects before their bucket
+    click.echo("Plan:")
+    click.echo(f"  1. terminate {len(instance_ids)} instances: {', '.join(instance_ids) or '-'}")
+    click.echo(f"  2. delete the records, then the zone, of {len(zones)} hosted zones: "
+               f"{', '.join(z['Name'] for z in zones) or '-'}")
+    click.echo(f"  3. delete every object version, then the bucket, of {len(buckets)} buckets: {', '.join(buckets) or '-'}")
+    if dry_run:
+        return
+    if not yes and not click.confirm("Delete all of this? It can't be undone"):
+        return
+
+    phase = time.perf_counter()
+    if instance_ids:
+        terminated = terminate_instances(instance_ids)
+        inventory.remove("ec2", terminated)
+        click.echo(f"Terminating {len(terminated)} instances ({time.perf_counter() - phase:.2f}s)")
+
+    phase = time.perf_counter()
+    if zones:
+        deleted_zones, records = delete_zones(zones, workers)
+        inventory.remove("route53", deleted_zones)
+        click.echo(f"Deleted {len(deleted_zones)} hosted zones and {records} records ({time.perf_counter() - phase:.2f}s)")
+
+    phase = time.perf_counter()
+    if buckets:
+        deleted_buckets, objects = destroy_buckets(buckets, workers)
+        inventory.remove("s3", deleted_buckets)
+        click.echo(f"Deleted {len(deleted_buckets)} buckets and {objects} object versions ({time.perf_counter() - phase:.2f}s)")
+
+    operations = ", ".join(f"{name} {row['calls']}" for name, row in recorder.summary().items())
+    click.echo(f"Done in {time.perf_counter() - start:.2f}s, {len(recorder.calls)} API calls ({operations})")
@@ -1,6 +1,7 @@
-import click, os
+import click, csv, json, os, sys, time
 from botocore.exceptions import ClientError
-from .globals import ec2_resource, ec2_client, TAGS, latest_ami
+from .globals import ec2_resource, ec2_client, get_tags, latest_ami, for_regions, regions_option, target_regions
+from . import inventory, jobs
 
 #makes subgroups under cli (the root command) {annaws ec2 / annaws s3}
 @click.group()
@@ -17,11 +18,110 @@ def annaws_instances(extra_filters=None):
         filters.extend(extra_filters)
     return list(ec2_resource.instances.filter(Filters=filters)) #convert collection to python list
 
+# same as annaws_instances but as raw DescribeInstances dicts, streamed page by page
+def iter_annaws_instances(extra_filters=None):
+    filters = [{'Name': 'tag:CreatedBy', 'Values': ['annaws-cli']}]
+    if extra_filters:
+        filters.extend(extra_filters)
+    for page in ec2_client.get_paginator("describe_instances").paginate(Filters=filters):
+        for reservation in page["Reservations"]:
+            yield from reservation["Instances"]
+
+class InstanceRecord:
+    """The few fields annaws shows for an instance (slots: thousands of rows stay small)"""
+    __slots__ = ("id", "name", "state", "instance_type", "public_ip", "image_id")
+    FIELDS = __slots__
+
+    def __init__(self, instance):
+        self.id = instance["InstanceId"]
+        self.name = next((t["Value"] for t in instance.get("Tags", []) if t["Key"] == "Name"), None)
+        self.state = instance["State"]["Name"]
+        self.instance_type = instance["InstanceType"]
+        self.public_ip = instance.get("PublicIpAddress")
+        self.image_id = instance.get("ImageId")
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+# pages DescribeInstances directly (no resource objects) and yields compact records as pages arrive;
+# the state filter is applied by EC2, not here
+def iter_instance_records(states=None, page_size=200):
+    filters = [{'Name': 'tag:CreatedBy', 'Values': ['annaws-cli']}]
+    if states:
+        filters.append({'Name': 'instance-state-name', 'Values': list(states)})
+    pages = ec2_client.get_paginator("describe_instances").paginate(Filters=filters, PaginationConfig={"PageSize": page_size})
+    for page in pages:
+        for reservation in page["Reservations"]:
+            for instance in reservation["Instances"]:
+                yield InstanceRecord(instance)
+
+# annaws inventory refresh: EC2 filters on the tag itself, so one DescribeInstances sweep and no tag lookups
+def refresh_instance_inventory(full=False, workers=None):
+    records = [record.as_dict() for record in iter_instance_records()]
+    inventory.replace("ec2", [(record["id"], record) for record in records])
+    return len(records), 0
+
+def parse_tag_selectors(ctx, param, values): # click callback: ("env=dev", ..) -> {"env": "dev"}
+    selectors = {}
+    for value in values:
+        if "=" not in value:
+            raise click.BadParameter(f"{value} (use KEY=VALUE)")
+        key, tag_value = value.split("=", 1)
+        selectors[key] = tag_value
+    return selectors
+
+# does the instance match the --name/--tag selectors (any of the names, all of the tags)
+def matches_selectors(instance, names, tag_selectors):
+    tags = {t["Key"]: t["Value"] for t in instance.get("Tags", [])}
+    if names and tags.get("Name") not in names:
+        return False
+    return all(tags.get(k) == v for k, v in tag_selectors.items())
+
 # return ID's in format i-123.. or () if none
 def format_instance_ids(instances):
     ids = [i.id for i in instances]
     return f"({', '.join(ids)})" if ids else "()"
 
+class WaitTimeout(Exception):
+    """Raised by wait_for_state when some instances didn't reach the state in time"""
+    def __init__(self, pending_ids, target_state):
+        super().__init__(f"Timed out waiting for {', '.join(sorted(pending_ids))} to be {target_state}")
+        self.pending_ids = pending_ids
+
+# states an instance can't come back from while we wait for it
+UNREACHABLE = {"running": {"shutting-down", "terminated"}, "stopped": {"shutting-down", "terminated"}}
+
+# one DescribeInstances poll loop for the whole batch (instead of a waiter per instance).
+# yields (instance dict, seconds waited) as soon as each instance reaches target_state
+# (or a state it can't get out of - check instance["State"]["Name"])
+def wait_for_state(instance_ids, target_state, interval=5, timeout=600):
+    pending = set(instance_ids)
+    start = time.monotonic()
+    while pending:
+        try:
+            pages = ec2_client.get_paginator("describe_instances").paginate(InstanceIds=sorted(pending))
+            instances = [i for page in pages for r in page["Reservations"] for i in r["Instances"]]
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "InvalidInstanceID.NotFound": # new ids can take a moment to show up
+                raise
+            instances = []
+        for instance in instances:
+            state = instance["State"]["Name"]
+            if instance["InstanceId"] in pending and (state == target_state or state in UNREACHABLE.get(target_state, ())):
+                pending.discard(instance["InstanceId"])
+                yield instance, time.monotonic() - start
+        if pending:
+            if time.monotonic() - start + interval > timeout:
+                raise WaitTimeout(pending, target_state)
+            time.sleep(interval)
+
+# shared options of the commands that wait for instances
+def wait_options(command):
+    command = click.option("--no-wait", is_flag=True, help="Return right away, the wait is recorded as a job (annaws jobs watch)")(command)
+    command = click.option("--wait-timeout", type=int, default=600, show_default=True, help="Seconds to wait before giving up")(command)
+    command = click.option("--wait-interval", type=float, default=5, show_default=True, help="Seconds between state polls")(command)
+    return command
+
 # Ensures --key exsists in AWS account, else it will create it and save locally
 def ensure_key_pair(key_name):
     try:
@@ -58,7 +158,8 @@ def ensure_key_pair(key_name):
 @click.option("--amount", type=int, default=1, help="Number of instances to create")
 @click.option("--image-os", type=click.Choice(['ubuntu', 'amazon-linux'], case_sensitive=False), default='ubuntu', help="Operating system for the instance")
 @click.option("--key", default=None, help="EC2 Key Pair name for SSH access  (will be created if missing)")
-def create(instance_type, name, amount, image_os, key):
+@wait_options
+def create(instance_type, name, amount, image_os, key, wait_interval, wait_timeout, no_wait):
     """Create EC2 instances (annaws ec2 create) """
     # user can't insert 0 or less instances to create
     if amount <= 0: 
@@ -74,7 +175,7 @@ def create(instance_type, name, amount, image_os, key):
                     f"   use: annaws ec2 manage stop <instance_id>")
         return
 
-    all_tags = TAGS + [{"Key": "Name", "Value": name}]
+    all_tags = get_tags() + [{"Key": "Name", "Value": name}]
 
     click.echo(f"Creating {amount} instance/s of type {instance_type} with OS {image_os}")
     click.echo(f"Tags: {all_tags}")
@@ -104,68 +205,166 @@ def create(instance_type, name, amount, image_os, key):
     #create instance command
     instances = ec2_resource.create_instances(**ec2_args)
     for i in instances:
-        i.wait_until_running()
-        i.reload()
+        inventory.add("ec2", i.id, {"id": i.id, "name": name, "state": "pending", "instance_type": instance_type,
+                                    "public_ip": None, "image_id": ec2_args["ImageId"]})
 
-    # print what was created
-    click.echo(f"Instances created:")
-    for i in instances:
-        click.echo(f"ID: {i.id}, Public IPv4: {i.public_ip_address}, Name: {name}")
+    if no_wait:
+        click.echo(f"Instances created: {', '.join(i.id for i in instances)}")
+        jobs.record("ec2", f"ec2 create {name}", "running", [i.id for i in instances])
+        return
+
+    # print each instance as soon as it's running
+    click.echo("Instances created, waiting for them to run:")
+    try:
+        for i, waited in wait_for_state([i.id for i in instances], "running", wait_interval, wait_timeout):
+            if i["State"]["Name"] != "running":
+                click.echo(f"ID: {i['InstanceId']} is {i['State']['Name']}, Name: {name}")
+                continue
+            click.echo(f"ID: {i['InstanceId']}, Public IPv4: {i.get('PublicIpAddress')}, Name: {name} (running after {waited:.1f}s)")
+    except WaitTimeout as e:
+        click.echo(f"{e}, check later with: annaws ec2 list")
     
 # ------------------------------------------------------------- annaws ec2 manage -------------------------------------------------------------
 
 @ec2.command()
 @click.argument('action', type=click.Choice(['start', 'stop']))
-@click.argument('instance_id')
-def manage(action, instance_id):
-    """Start/Stop an EC2 instance (annaws ec2 manage) """
-    existing_ids = [i.id for i in annaws_instances()]
-    if instance_id not in existing_ids:
-        click.echo(f"Instance {instance_id} was not created by annaws-cli")
+@click.argument('instance_ids', nargs=-1)
+@click.option("--name", "names", multiple=True, help="Select instances by Name tag (can repeat)")
+@click.option("--tag", "tag_selectors", multiple=True, callback=parse_tag_selectors, help="Select instances by tag KEY=VALUE (can repeat, all must match)")
+@wait_options
+def manage(action, instance_ids, names, tag_selectors, wait_interval, wait_timeout, no_wait):
+    """Start/Stop EC2 instances by id, --name or --tag (annaws ec2 manage) """
+    if not instance_ids and not names and not tag_selectors:
+        click.echo("Give instance ids and/or --name/--tag selectors")
         return
-    
-    current_instance = ec2_resource.Instance(instance_id)
+
+    # one DescribeInstances snapshot of every live annaws instance: resolves the ids and
+    # selectors and counts running instances for the quota at the same time
+    live_states = ['pending', 'running', 'stopping', 'stopped']
+    annaws_live = list(iter_annaws_instances([{'Name': 'instance-state-name', 'Values': live_states}]))
+    by_id = {i["InstanceId"]: i for i in annaws_live}
+    for instance_id in instance_ids:
+        if instance_id not in by_id:
+            click.echo(f"Instance {instance_id} was not created by annaws-cli")
+            return
+    targets = {instance_id: by_id[instance_id] for instance_id in instance_ids}
+    if names or tag_selectors:
+        for i in annaws_live:
+            if matches_selectors(i, names, tag_selectors):
+                targets.setdefault(i["InstanceId"], i)
+    if not targets:
+        click.echo("No annaws-cli instances match the selectors")
+        return
+
+    def in_state(*states):
+        return [i for i, inst in targets.items() if inst["State"]["Name"] in states]
+
     if action == "start":
-        annaws_running_instances = annaws_instances([{'Name': 'instance-state-name', 'Values': ['running']}])
-        if len(annaws_running_instances) == 2:
-            click.echo(f"You can only have 2 running instances. Currently running: {len(annaws_running_instances)}")
+        running_ids = [i["InstanceId"] for i in annaws_live if i["State"]["Name"] in ('pending', 'running')]
+        to_start = in_state('stopped')
+        for instance_id in in_state('stopping'):
+            click.echo(f"Instance {instance_id} is still stopping, try again when it's stopped")
+        if len(running_ids) + len(to_start) > 2:
+            click.echo(f"You can only have 2 running instances. Currently running: {len(running_ids)}, asked to start: {len(to_start)}")
             return
-        current_instance.start()
-        click.echo(f"Starting instance {instance_id}, please wait")
-        current_instance.wait_until_running()
-        click.echo(f"Instance {instance_id} is now running")
+        if to_start:
+            ec2_client.start_instances(InstanceIds=to_start)
+            click.echo(f"Starting instance/s {', '.join(to_start)}, please wait")
+        wait_ids = to_start + in_state('pending', 'running')
+        target_state, done_message = "running", "is now running"
     elif action == 'stop':
-        current_instance.stop()
-        click.echo(f"Stopping instance {instance_id}, please wait")
-        current_instance.wait_until_stopped()
-        click.echo(f"Instance {instance_id} has stopped")
+        to_stop = in_state('pending', 'running')
+        if to_stop:
+            ec2_client.stop_instances(InstanceIds=to_stop)
+            click.echo(f"Stopping instance/s {', '.join(to_stop)}, please wait")
+        wait_ids = to_stop + in_state('stopping', 'stopped')
+        target_state, done_message = "stopped", "has stopped"
+
+    if no_wait:
+        moving = [i for i in wait_ids if targets[i]["State"]["Name"] != target_state]
+        if moving:
+            jobs.record("ec2", f"ec2 manage {action}", target_state, moving)
+        return
+
+    # every wait runs in the same poll loop
+    try:
+        for i, waited in wait_for_state(wait_ids, target_state, wait_interval, wait_timeout):
+            if i["State"]["Name"] != target_state:
+                click.echo(f"Instance {i['InstanceId']} is {i['State']['Name']}")
+                continue
+            click.echo(f"Instance {i['InstanceId']} {done_message} ({waited:.1f}s)")
+    except WaitTimeout as e:
+        click.echo(str(e))
 
 # ------------------------------------------------------------- annaws ec2 list -------------------------------------------------------------
 @ec2.command(name="list")
-def list_ec2():
+@click.option("--output", "output_format", type=click.Choice(['text', 'table', 'json', 'csv']), default='text', help="Output format (default text)")
+@click.option("--state", "states", multiple=True,
+              type=click.Choice(['pending', 'running', 'stopping', 'stopped', 'shutting-down', 'terminated']),
+              help="Only instances in this state (can repeat)")
+@regions_option
+def list_ec2(output_format, states, regions):
     """List EC2 instances created by annaws-cli """
+    # mapping: AMI → OS (cached, see globals.latest_ami - AMI ids differ between regions)
+    def ami_names():
+        return {
+            latest_ami("ubuntu"): "Ubuntu",
+            latest_ami("amazon-linux"): "Amazon Linux"
+        }
 
-    instances = annaws_instances()
-    if not instances:
-        click.echo("No instance was created by annaws")
-        return
-    
-    # mapping: AMI → OS
-    ami_to_os = {
-        latest_ami("ubuntu"): "Ubuntu",
-        latest_ami("amazon-linux"): "Amazon Linux"
-    }
-    
-    for i in instances:
-        for tag in i.tags:
-            if tag["Key"] == "Name":
-                click.echo(f"Instance Name: {tag['Value']}")
-        os_name = ami_to_os.get(i.image_id, i.image_id)        
-        click.echo(
-            f"  Id: {i.id}, " 
-            f"State: {i.state['Name']}, "
-            f"Type: {i.instance_type}, "
-            f"public IP: {i.public_ip_address}, "
-            f"OS: {os_name} "
-        )
+    # one region: rows are printed as the pages arrive, nothing is collected.
+    # --regions: every region is listed (with its AMI names) at once, rows come out by region, then name and id
+    def records():
+        if not regions:
+            ami_to_os = None
+            for record in iter_instance_records(states):
+                ami_to_os = ami_to_os or ami_names()
+                yield record, None, ami_to_os
+            return
+        def region_listing():
+            found = sorted(iter_instance_records(states), key=lambda record: (record.name or "", record.id))
+            return found, ami_names() if found else {}
+        for region, listing, error in for_regions(target_regions(regions), region_listing):
+            if error:
+                click.echo(f"{region}: skipped, {error}", err=True)
+                continue
+            found, ami_to_os = listing
+            for record in found:
+                yield record, region, ami_to_os
 
+    count = 0
+    table_row = "{:<20} {:<21} {:<14} {:<10} {:<16} " + ("{:<13} {}" if regions else "{}")
+    region_column = ("REGION",) if regions else ()
+    writer = csv.writer(sys.stdout, lineterminator="\n") if output_format == "csv" else None
+    for record, region, ami_to_os in records():
+        row = dict(record.as_dict(), os=ami_to_os.get(record.image_id, record.image_id))
+        if regions:
+            row["region"] = region
+        if output_format == "text":
+            if record.name is not None:
+                click.echo(f"Instance Name: {record.name}")
+            click.echo(
+                f"  Id: {record.id}, "
+                f"State: {record.state}, "
+                f"Type: {record.instance_type}, "
+                f"public IP: {record.public_ip}, "
+                + (f"OS: {row['os']}, Region: {region}" if regions else f"OS: {row['os']} ")
+            )
+        elif output_format == "table":
+            if count == 0:
+                click.echo(table_row.format("NAME", "ID", "STATE", "TYPE", "PUBLIC IP", "OS", *region_column))
+            click.echo(table_row.format(str(record.name), record.id, record.state, record.instance_type, str(record.public_ip), row["os"],
+                                        *([region] if regions else [])))
+        elif output_format == "json":
+            click.echo(("[" if count == 0 else ",") + json.dumps(row))
+        elif output_format == "csv":
+            if count == 0:
+                writer.writerow(list(row))
+            writer.writerow(row.values())
+            sys.stdout.flush()
+        count += 1
+
+    if output_format == "json":
+        click.echo("]" if count else "[]")
+    elif count == 0 and output_format != "csv":
+        click.echo("No instance was created by annaws")
@@ -1,28 +1,340 @@
-import click, boto3
-from botocore.exceptions import ClientError
+import click, os, random, threading, time
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from botocore.exceptions import BotoCoreError, ClientError
+from . import cache
+
+# ------------------------------------------------------------- Lazy AWS clients -------------------------------------------------------------
+# nothing here talks to AWS at import time: boto3 is imported, the session is built and
+# every client/resource is created on first use (so "annaws --help" makes no aws calls)
+
+_session = None
+_clients = {}
+_lock = threading.Lock() # boto3 sessions are not thread safe when creating clients
+_local = threading.local() # region of the current thread when it differs from the session's (see in_region)
+
+CONFIG_FILE = os.path.join(os.path.expanduser("~"), ".annaws.toml")
+
+# one tuned http layer for every client: settings come from ~/.annaws.toml, then the root cli options
+SETTINGS = {
+    "profile": None,              # aws profile (default: AWS_PROFILE / default)
+    "region": None,               # aws region (default: from the profile)
+    "max_workers": 16,            # threads used by the parallel scans/uploads
+    "max_pool_connections": 50,   # http connections shared by those threads (botocore default is 10)
+    "retry_mode": "adaptive",     # botocore retries: legacy, standard or adaptive (client side rate limiting)
+    "max_attempts": 10,
+    "connect_timeout": 5,
+    "read_timeout": 60,
+    "endpoints": {},              # per-service endpoint overrides, e.g. {"s3": "http://localhost:4566"}
+    "engine": "sync",             # scans and uploads on thread pools (sync) or an asyncio event loop (async, see aio.py)
+    "region_timeout": 60,         # seconds --regions waits for a region before skipping it
+}
+
+_DEFAULT_SETTINGS = dict(SETTINGS)
+_SETTING_RANGES = {"max_workers": (1, 512), "max_pool_connections": (1, None), "max_attempts": (1, None)} # (min, max), as the cli options
+_session_hooks = [] # called with every new session before its clients are created (see trace.py)
+
+def _setting_type(key): # what a config file value of key must be, from its default
+    default = _DEFAULT_SETTINGS[key]
+    if default is None: # profile, region
+        return str
+    if key.endswith("_timeout"): # seconds, fractions allowed
+        return (int, float)
+    return type(default)
+
+# ~/.annaws.toml: top-level keys as in SETTINGS, plus an [endpoints] table.
+# only the default path may be missing, a file given with --config / ANNAWS_CONFIG must exist
+def load_config_file(path=CONFIG_FILE, must_exist=False):
+    if not os.path.exists(path):
+        if must_exist:
+            raise click.ClickException(f"Config file {path} not found")
+        return {}
+    try:
+        import tomllib
+    except ImportError: # python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            click.echo(f"Warning: {path} ignored, reading it needs python 3.11+ or: pip install tomli", err=True)
+            return {}
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(f"Invalid config file {path}: {e}")
+    unknown = set(data) - set(SETTINGS)
+    if unknown:
+        click.echo(f"Warning: unknown keys in {path}: {', '.join(sorted(unknown))}", err=True)
+    settings = {k: v for k, v in data.items() if k in SETTINGS}
+    for key, value in settings.items():
+        expected = _setting_type(key)
+        if isinstance(value, bool) and expected is not bool or not isinstance(value, expected): # toml true is no number
+            names = " or ".join(t.__name__ for t in (expected if isinstance(expected, tuple) else (expected,)))
+            raise click.ClickException(f"Invalid config file {path}: {key} must be {names}, got {value!r}")
+        low, high = _SETTING_RANGES.get(key, (None, None))
+        if (low is not None and value < low) or (high is not None and value > high):
+            bounds = f"between {low} and {high}" if high is not None else f"at least {low}"
+            raise click.ClickException(f"Invalid config file {path}: {key} must be {bounds}, got {value!r}")
+    bad_endpoints = [k for k, v in settings.get("endpoints", {}).items() if not isinstance(v, str)]
+    if bad_endpoints:
+        raise click.ClickException(f"Invalid config file {path}: endpoints.{bad_endpoints[0]} must be a URL string")
+    return settings
+
+# apply settings (None values are ignored); clients built with the old settings are dropped
+def configure(reset=False, **settings):
+    global _session
+    with _lock:
+        if reset:
+            SETTINGS.clear()
+            SETTINGS.update(_DEFAULT_SETTINGS, endpoints={})
+            _session_hooks.clear()
+        for key, value in settings.items():
+            if value is not None:
+                SETTINGS[key] = value
+        _session = None
+        _clients.clear()
+
+def add_session_hook(hook):
+    global _session
+    with _lock:
+        _session_hooks.append(hook)
+        _session = None # the next session (and its clients) get the hook
+        _clients.clear()
+
+def session_hooks():
+    return list(_session_hooks)
+
+def max_workers():
+    return SETTINGS["max_workers"]
+
+def session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3 # slow import, only paid by commands that need aws
+                from botocore.exceptions import ProfileNotFound
+                try:
+                    _session = boto3.session.Session(profile_name=SETTINGS["profile"], region_name=SETTINGS["region"])
+                except ProfileNotFound as e:
+                    raise click.ClickException(str(e))
+                for hook in _session_hooks:
+                    hook(_session)
+    return _session
+
+def get_region():
+    return getattr(_local, "region", None) or session().region_name
+
+# clients, cache keys and inventory scopes of this thread follow region until the block ends
+@contextmanager
+def in_region(region):
+    previous = getattr(_local, "region", None)
+    _local.region = region
+    try:
+        yield
+    finally:
+        _local.region = previous
+
+# fn for a thread pool started from this thread: pool threads don't inherit in_region, the wrapper
+# runs every call in the region of the thread that built it
+def region_bound(fn):
+    region = get_region()
+    def call(*args, **kwargs):
+        with in_region(region):
+            return fn(*args, **kwargs)
+    return call
+
+def client_config(config_class=None): # aio.py passes aiobotocore's AioConfig
+    from botocore.config import Config
+    return (config_class or Config)(
+        max_pool_connections=max(SETTINGS["max_pool_connections"], SETTINGS["max_workers"]), # never fewer connections than threads
+        retries={"mode": SETTINGS["retry_mode"], "max_attempts": SETTINGS["max_attempts"]},
+        connect_timeout=SETTINGS["connect_timeout"],
+        read_timeout=SETTINGS["read_timeout"]
+    )
+
+# one client per (kind, service, region), all from the same session
+def _create(kind, service):
+    region = getattr(_local, "region", None) or _session.region_name
+    key = (kind, service, region)
+    if key not in _clients:
+        with _lock:
+            if key not in _clients:
+                factory = _session.client if kind == "client" else _session.resource
+                _clients[key] = factory(
+                    service,
+                    region_name=region,
+                    endpoint_url=SETTINGS["endpoints"].get(service),
+                    config=client_config()
+                )
+    return _clients[key]
+
+def client(service):
+    session()
+    return _create("client", service)
+
+# puts a ready-made client (e.g. a benchmark stub) in the registry for service in the current region
+def set_client(service, stub, kind="client"):
+    session()
+    with _lock:
+        _clients[(kind, service, get_region())] = stub
+
+def resource(service):
+    session()
+    return _create("resource", service)
+
+class LazyAWS:
+    """Stands in for a boto3 client/resource and creates it on first attribute access"""
+    def __init__(self, kind, service):
+        self._kind = kind
+        self._service = service
+
+    def __getattr__(self, name):
+        target = client(self._service) if self._kind == "client" else resource(self._service)
+        return getattr(target, name)
+
+    def __repr__(self):
+        return f"<lazy {self._service} {self._kind}>"
 
 # global resources
-ec2_client = boto3.client("ec2")
-ec2_resource = boto3.resource("ec2")
-s3_resource = boto3.resource("s3")
-s3_client = boto3.client("s3")
-route53_client = boto3.client("route53")
+ec2_client = LazyAWS("client", "ec2")
+ec2_resource = LazyAWS("resource", "ec2")
+s3_resource = LazyAWS("resource", "s3")
+s3_client = LazyAWS("client", "s3")
+route53_client = LazyAWS("client", "route53")
+ssm_client = LazyAWS("client", "ssm")
+
+# cache keys are scoped to the active profile and region
+def _cache_scope():
+    return (session().profile_name, get_region())
+
+# ------------------------------------------------------------- Regions -------------------------------------------------------------
+
+# regions enabled for the account (one DescribeRegions call, cached like the AMI ids)
+def enabled_regions():
+    def lookup():
+        return sorted(r["RegionName"] for r in client("ec2").describe_regions()["Regions"])
+    return cache.cached((session().profile_name, "ec2", "regions"), lookup, cache.AMI_TTL)
+
+def parse_regions(ctx, param, value): # click callback: "all" / "eu-west-1,us-east-1" -> "all" / list of regions
+    if value is None or value == "all":
+        return value
+    regions = sorted({r.strip() for r in value.split(",") if r.strip()})
+    if not regions:
+        raise click.BadParameter(f"{value!r} (use all or REGION,REGION..)")
+    return regions
+
+def regions_option(command):
+    return click.option("--regions", default=None, callback=parse_regions,
+                        help="Query several regions at once: all, or a comma separated list (default: only --region)")(command)
+
+def target_regions(regions): # --regions value -> region names, None when not given
+    return enabled_regions() if regions == "all" else regions
+
+# runs fn() for every region at once, each in a thread bound to its region (in_region). yields
+# (region, result, error) in region order, each as soon as it and the regions before it are done;
+# a failing region gives its error (result None) and the others go on. Regions that haven't answered
+# region_timeout seconds after the start are skipped with a TimeoutError: their threads are daemons,
+# so an unreachable region (connect timeouts times retries) doesn't keep the command from exiting
+def for_regions(regions, fn, workers=None):
+    slots = threading.BoundedSemaphore(max(1, workers or max_workers()))
+    def run(region, future):
+        with slots:
+            if not future.set_running_or_notify_cancel(): # skipped while it waited for a slot
+                return
+            try:
+                with in_region(region):
+                    future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+    futures = []
+    for region in regions:
+        future = Future()
+        threading.Thread(target=run, args=(region, future), daemon=True).start()
+        futures.append((region, future))
+    timeout = SETTINGS["region_timeout"]
+    deadline = time.monotonic() + timeout
+    for region, future in futures:
+        try:
+            yield region, future.result(timeout=max(0, deadline - time.monotonic())), None
+        except FutureTimeout:
+            future.cancel()
+            yield region, None, TimeoutError(f"no answer within {timeout}s (region_timeout)")
+        except (BotoCoreError, ClientError, click.ClickException) as e:
+            yield region, None, e
 
-region = boto3.session.Session().region_name
-ssm_client = boto3.client("ssm", region_name=region)
+# ------------------------------------------------------------- Throttling -------------------------------------------------------------
 
-#get aws username
+THROTTLE_CODES = ("SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded",
+                  "TooManyRequestsException", "PriorRequestNotComplete")
+
+class AdaptiveBackoff:
+    """Delay shared by all threads of a scan: grows on throttling, shrinks again on success"""
+    def __init__(self, base=0.05, cap=5.0, max_retries=8):
+        self.base = base
+        self.cap = cap
+        self.max_retries = max_retries
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def throttled(self):
+        with self._lock:
+            self.delay = min(self.cap, max(self.base, self.delay * 2))
+
+    def succeeded(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base else 0.0
+
+    def wait(self):
+        if self.delay:
+            time.sleep(random.uniform(0, self.delay)) # jitter, so threads don't retry in lockstep
+
+    # call an api method, retrying throttling errors (other errors and the last throttle are raised)
+    def call(self, method, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.wait()
+            try:
+                result = method(**kwargs)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in THROTTLE_CODES or attempt == self.max_retries:
+                    raise
+                self.throttled()
+                continue
+            self.succeeded()
+            return result
+
+#get aws username (cached per profile, see cache.py)
 def aws_username():
-    sts = boto3.client("sts")
-    identity = sts.get_caller_identity()
-    return identity["Arn"].split('/')[-1]
+    def lookup():
+        identity = client("sts").get_caller_identity()
+        return identity["Arn"].split('/')[-1]
+    return cache.cached(_cache_scope() + ("sts", "caller-identity"), lookup, cache.IDENTITY_TTL)
 
-# Build base tags
-OWNER = aws_username()
-TAGS = [
-    {"Key": "CreatedBy", "Value": "annaws-cli"},
-    {"Key": "Owner", "Value": OWNER}
-]
+# Build base tags (resolved once, only by commands that tag or name resources)
+_owner = None
+
+def get_owner():
+    global _owner
+    if _owner is None:
+        _owner = aws_username()
+    return _owner
+
+def get_tags():
+    return [
+        {"Key": "CreatedBy", "Value": "annaws-cli"},
+        {"Key": "Owner", "Value": get_owner()}
+    ]
+
+# keeps "from annaws.globals import OWNER/TAGS/region" working, resolved on access
+def __getattr__(name):
+    if name == "OWNER":
+        return get_owner()
+    if name == "TAGS":
+        return get_tags()
+    if name == "region":
+        return get_region()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # find lates ubuntu or amazon-linux
 def latest_ami(image_os):
@@ -32,9 +344,11 @@ def latest_ami(image_os):
         os_path = '/aws/service/canonical/ubuntu/server/20.04/stable/current/amd64/hvm/ebs-gp2/ami-id'
     else:
         raise ValueError("Unsupported OS")
-    try:
+    def lookup():
         image = ssm_client.get_parameter(Name=os_path)
         return image['Parameter']['Value']
+    try:
+        return cache.cached(_cache_scope() + ("ssm", os_path), lookup, cache.AMI_TTL)
     except ClientError as e:
         click.echo(f"Error retrieving AMI Id from SSM: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,164 @@
+import click, json, os, sqlite3, threading, time
+from .cache import CACHE_DIR
+from .globals import for_regions, regions_option, target_regions
+
+# ------------------------------------------------------------- Local inventory -------------------------------------------------------------
+# sqlite index (~/.annaws/inventory.db) of the instances, buckets and zones seen by annaws, per profile:
+# owned rows answer list and ownership queries without rescanning tags, not-owned rows let the
+# next refresh skip resources whose tags were already checked (only new ones cost tag calls).
+# full scans rewrite the index, create commands add to it, --fresh bypasses it
+
+DB_FILE = os.path.join(CACHE_DIR, "inventory.db")
+MAX_AGE = 24 * 3600 # older indexes are rescanned (annaws inventory refresh renews them)
+KINDS = ("ec2", "s3", "route53")
+
+_settings = {"fresh": False}
+_db = None
+_unavailable = False # the index couldn't be opened: every read misses and every write is skipped
+_lock = threading.Lock()
+_ERRORS = (OSError, sqlite3.Error) # read-only home, corrupted db etc. - the index is best effort
+
+# set from the root cli option --fresh
+def configure(fresh=False):
+    _settings.update(fresh=fresh)
+
+def _connect(): # None when the index can't be used
+    global _db, _unavailable
+    if _db is None and not _unavailable:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            db = sqlite3.connect(DB_FILE, check_same_thread=False)
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS resources (
+                    scope TEXT, kind TEXT, id TEXT, owned INTEGER, position INTEGER, data TEXT,
+                    PRIMARY KEY (scope, kind, id));
+                CREATE TABLE IF NOT EXISTS refreshes (
+                    scope TEXT, kind TEXT, refreshed REAL,
+                    PRIMARY KEY (scope, kind));
+            """)
+            _db = db
+        except _ERRORS:
+            _unavailable = True
+    return _db
+
+# runs query(db) under the lock, default when the index is unavailable or the query fails
+def _run(query, default=None):
+    try:
+        with _lock:
+            db = _connect()
+            return default if db is None else query(db)
+    except _ERRORS:
+        return default
+
+# buckets and zones are account wide, instances belong to one region
+def _scope(kind):
+    from .globals import session, get_region
+    return f"{session().profile_name}|{get_region() if kind == 'ec2' else 'global'}"
+
+def age(kind): # seconds since the last full scan of kind, None if never (or the index can't answer)
+    row = _run(lambda db: db.execute("SELECT refreshed FROM refreshes WHERE scope=? AND kind=?", (_scope(kind), kind)).fetchone())
+    return time.time() - row[0] if row else None
+
+def usable(kind): # index may answer for kind: not --fresh and scanned less than MAX_AGE ago
+    if _settings["fresh"]:
+        return False
+    seconds = age(kind)
+    return seconds is not None and seconds < MAX_AGE
+
+# every indexed resource of kind: id -> (owned, data)
+def known(kind):
+    rows = _run(lambda db: db.execute("SELECT id, owned, data FROM resources WHERE scope=? AND kind=?", (_scope(kind), kind)).fetchall(), [])
+    return {resource_id: (bool(owned), json.loads(data)) for resource_id, owned, data in rows}
+
+# data of the owned resources of kind in scan order, None when the index can't answer
+def owned(kind):
+    if not usable(kind):
+        return None
+    rows = _run(lambda db: db.execute("SELECT data FROM resources WHERE scope=? AND kind=? AND owned=1 ORDER BY position",
+                                      (_scope(kind), kind)).fetchall())
+    if rows is None:
+        return None
+    seconds = age(kind)
+    click.echo(f"(from the local inventory, {seconds / 60:.0f} min old - --fresh to rescan)", err=True)
+    return [json.loads(data) for data, in rows]
+
+# (owned, data) of one resource, None when unknown (or the index can't answer)
+def lookup(kind, resource_id):
+    if not usable(kind):
+        return None
+    row = _run(lambda db: db.execute("SELECT owned, data FROM resources WHERE scope=? AND kind=? AND id=?",
+                                     (_scope(kind), kind, resource_id)).fetchone())
+    return (bool(row[0]), json.loads(row[1])) if row else None
+
+# result of a full scan: owned is a list of (id, data) in scan order, not_owned the other ids seen
+def replace(kind, owned_items, not_owned_ids=()):
+    scope = _scope(kind)
+    rows = [(scope, kind, resource_id, 1, position, json.dumps(data)) for position, (resource_id, data) in enumerate(owned_items)]
+    rows += [(scope, kind, resource_id, 0, None, "null") for resource_id in not_owned_ids]
+    def write(db):
+        with db:
+            db.execute("DELETE FROM resources WHERE scope=? AND kind=?", (scope, kind))
+            db.executemany("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?)", rows)
+            db.execute("INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?)", (scope, kind, time.time()))
+    _run(write)
+
+# single resources created or checked by a command (kept until the next full scan of kind)
+def add(kind, resource_id, data=None, owned=True):
+    scope = _scope(kind)
+    def write(db):
+        with db:
+            position = db.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM resources WHERE scope=? AND kind=?", (scope, kind)).fetchone()[0]
+            db.execute("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?)",
+                       (scope, kind, resource_id, int(owned), position if owned else None, json.dumps(data)))
+    _run(write)
+
+def remove(kind, resource_ids):
+    scope = _scope(kind)
+    def write(db):
+        with db:
+            db.executemany("DELETE FROM resources WHERE scope=? AND kind=? AND id=?", [(scope, kind, i) for i in resource_ids])
+    _run(write)
+
+# ------------------------------------------------------------- annaws inventory -------------------------------------------------------------
+
+@click.group()
+def inventory():
+    """Local index of the resources created by annaws-cli"""
+    pass
+
+@inventory.command()
+@click.option("--kind", "kinds", type=click.Choice(KINDS), multiple=True, help="Only this resource kind (can repeat, default: all)")
+@click.option("--full", is_flag=True, help="Check the tags of every resource again, not only of new ones")
+@click.option("--workers", type=click.IntRange(1, 512), default=None, help="Parallel tag lookups (default: --max-workers)")
+@regions_option
+def refresh(kinds, full, workers, regions):
+    """Update the index: list every resource, fetch tags only for ones not seen before"""
+    from .ec2 import refresh_instance_inventory
+    from .s3 import refresh_bucket_inventory
+    from .route53 import refresh_zone_inventory
+    refreshers = {"ec2": refresh_instance_inventory, "s3": refresh_bucket_inventory, "route53": refresh_zone_inventory}
+    for kind in kinds or KINDS:
+        start = time.perf_counter()
+        if kind == "ec2" and regions: # instances are indexed per region: every region at once
+            for region, result, error in for_regions(target_regions(regions), lambda: refresh_instance_inventory(full=full, workers=workers)):
+                if error:
+                    click.echo(f"ec2 {region}: skipped, {error}", err=True)
+                    continue
+                click.echo(f"ec2 {region}: {result[0]} annaws-cli resources, {time.perf_counter() - start:.2f}s")
+            continue
+        found, checked = refreshers[kind](full=full, workers=workers)
+        click.echo(f"{kind}: {found} annaws-cli resources, {checked} tag lookups, {time.perf_counter() - start:.2f}s")
+
+@inventory.command(name="list")
+@click.option("--kind", "kinds", type=click.Choice(KINDS), multiple=True, help="Only this resource kind (can repeat, default: all)")
+def list_inventory(kinds):
+    """Show the indexed annaws-cli resources (no AWS calls)"""
+    for kind in kinds or KINDS:
+        seconds = age(kind)
+        items = [(resource_id, data) for resource_id, (is_owned, data) in sorted(known(kind).items()) if is_owned]
+        refreshed = "never refreshed" if seconds is None else f"refreshed {seconds / 60:.0f} min ago"
+        click.echo(f"{kind} ({len(items)}, {refreshed}):")
+        for resource_id, data in items:
+            label = next((data[key] for key in ("Name", "name", "Region") if data.get(key) and data[key] != resource_id), "") # zone name, Name tag, bucket region
+            state = f" ({data['state']})" if "state" in data else ""
+            click.echo(f"  {resource_id}  {label}{state}")
@@ -0,0 +1,205 @@
+import click, os, sqlite3, threading, time
+from .cache import CACHE_DIR
+from .globals import ec2_client, route53_client, session, get_region, in_region, AdaptiveBackoff
+
+# ------------------------------------------------------------- Local job store -------------------------------------------------------------
+# sqlite list (~/.annaws/jobs.db) of the operations commands started without waiting for them
+# (ec2 create/manage --no-wait, route53 changes with --track): a job is a set of instance ids or change ids and
+# the state they should reach. "annaws jobs watch" polls every pending one in batched calls and
+# stores when each got there, so many launches are followed by one loop instead of one wait each
+
+DB_FILE = os.path.join(CACHE_DIR, "jobs.db")
+KEEP_FINISHED = 7 * 24 * 3600 # finished jobs are dropped after a week
+EC2_FILTER_VALUES = 200       # max values of one DescribeInstances filter
+
+_db = None
+_lock = threading.Lock()
+
+def _connect():
+    global _db
+    if _db is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        db = sqlite3.connect(DB_FILE, check_same_thread=False)
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, profile TEXT, region TEXT, kind TEXT,
+                command TEXT, target TEXT, submitted REAL, finished REAL);
+            CREATE TABLE IF NOT EXISTS items (
+                job_id INTEGER, resource_id TEXT, state TEXT, done REAL,
+                PRIMARY KEY (job_id, resource_id));
+        """)
+        with db:
+            old = [job_id for job_id, in db.execute("SELECT id FROM jobs WHERE finished < ?", (time.time() - KEEP_FINISHED,))]
+            db.executemany("DELETE FROM items WHERE job_id=?", [(job_id,) for job_id in old])
+            db.executemany("DELETE FROM jobs WHERE id=?", [(job_id,) for job_id in old])
+        _db = db
+    return _db
+
+def _profile():
+    return session().profile_name
+
+# records a job: kind "ec2" (instance ids, target state) or "route53" (change ids, INSYNC). Returns its id
+def add(kind, command, target, resource_ids):
+    region = get_region() if kind == "ec2" else None # instances belong to a region, changes are global
+    with _lock:
+        db = _connect()
+        with db:
+            job_id = db.execute("INSERT INTO jobs (profile, region, kind, command, target, submitted) VALUES (?, ?, ?, ?, ?, ?)",
+                                (_profile(), region, kind, command, target, time.time())).lastrowid
+            db.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, NULL, NULL)", [(job_id, i) for i in resource_ids])
+    return job_id
+
+# what the --no-wait/--track commands call once AWS accepted the operation: a store that can't be
+# written (read-only home etc.) only costs the job, the command itself already succeeded
+def record(kind, command, target, resource_ids):
+    try:
+        job_id = add(kind, command, target, resource_ids)
+    except (OSError, sqlite3.Error) as e:
+        click.echo(f"Warning: the job couldn't be recorded in {DB_FILE}: {e}", err=True)
+        return
+    click.echo(f"Recorded as job {job_id}, follow it with: annaws jobs watch")
+
+# pending items of this profile's jobs: [(job id, kind, region, target, resource id, submitted)]
+def pending():
+    with _lock:
+        return _connect().execute("""
+            SELECT jobs.id, kind, region, target, resource_id, submitted FROM items JOIN jobs ON jobs.id = items.job_id
+            WHERE profile IS ? AND done IS NULL ORDER BY jobs.id""", (_profile(),)).fetchall()
+
+# stores that resource_id of job_id got to state; returns True when that was the job's last pending item
+def finish(job_id, resource_id, state, when):
+    with _lock:
+        db = _connect()
+        with db:
+            db.execute("UPDATE items SET state=?, done=? WHERE job_id=? AND resource_id=?", (state, when, job_id, resource_id))
+            left = db.execute("SELECT COUNT(*) FROM items WHERE job_id=? AND done IS NULL", (job_id,)).fetchone()[0]
+            if not left:
+                db.execute("UPDATE jobs SET finished=? WHERE id=?", (when, job_id))
+    return not left
+
+def clear(everything=False): # drops the finished jobs of this profile (all of them with everything=True)
+    with _lock:
+        db = _connect()
+        with db:
+            query = "SELECT id FROM jobs WHERE profile IS ?" + ("" if everything else " AND finished IS NOT NULL")
+            ids = [job_id for job_id, in db.execute(query, (_profile(),))]
+            db.executemany("DELETE FROM items WHERE job_id=?", [(job_id,) for job_id in ids])
+            db.executemany("DELETE FROM jobs WHERE id=?", [(job_id,) for job_id in ids])
+    return len(ids)
+
+def jobs_list():
+    with _lock:
+        db = _connect()
+        jobs = db.execute("SELECT id, region, kind, command, target, submitted, finished FROM jobs WHERE profile IS ? ORDER BY id",
+                          (_profile(),)).fetchall()
+        items = db.execute("SELECT job_id, resource_id, state, done FROM items").fetchall()
+    by_job = {}
+    for job_id, resource_id, state, done in items:
+        by_job.setdefault(job_id, []).append((resource_id, state, done))
+    return [(job, by_job.get(job[0], [])) for job in jobs]
+
+# ------------------------------------------------------------- Polling -------------------------------------------------------------
+
+# states of the pending instances of one region: DescribeInstances filtered on their ids
+# (a filter, unlike InstanceIds, doesn't fail on ids EC2 doesn't show yet), one call per 200 ids
+def instance_states(instance_ids):
+    states = {}
+    for start in range(0, len(instance_ids), EC2_FILTER_VALUES):
+        chunk = instance_ids[start:start + EC2_FILTER_VALUES]
+        pages = ec2_client.get_paginator("describe_instances").paginate(Filters=[{"Name": "instance-id", "Values": chunk}])
+        for page in pages:
+            for reservation in page["Reservations"]:
+                for instance in reservation["Instances"]:
+                    states[instance["InstanceId"]] = instance["State"]["Name"]
+    return states
+
+# route53 has no batch GetChange: one call per pending change id, all on the same backoff
+def change_states(change_ids, backoff):
+    return {change_id: backoff.call(route53_client.get_change, Id=change_id)["ChangeInfo"]["Status"] for change_id in change_ids}
+
+# one poll of every pending item: yields (job id, resource id, state, seconds since submitted, job finished)
+# for the ones that reached their target (or, for instances, a state they can't leave)
+def tick(backoff):
+    from .ec2 import UNREACHABLE
+    items = pending()
+    states = {}
+    for region in sorted({region for _, kind, region, *_ in items if kind == "ec2"}):
+        ids = sorted({resource_id for _, kind, item_region, _, resource_id, _ in items if kind == "ec2" and item_region == region})
+        with in_region(region):
+            states.update(instance_states(ids))
+    change_ids = sorted({resource_id for _, kind, _, _, resource_id, _ in items if kind == "route53"})
+    if change_ids:
+        states.update(change_states(change_ids, backoff))
+
+    now = time.time()
+    for job_id, kind, _, target, resource_id, submitted in items:
+        state = states.get(resource_id)
+        if state == target or state in UNREACHABLE.get(target, ()):
+            yield job_id, resource_id, state, now - submitted, finish(job_id, resource_id, state, now)
+
+# ------------------------------------------------------------- annaws jobs -------------------------------------------------------------
+
+@click.group()
+def jobs():
+    """Follow the operations started without waiting (--no-wait, --track)"""
+    try:
+        with _lock:
+            _connect()
+    except (OSError, sqlite3.Error) as e:
+        raise click.ClickException(f"The job store {DB_FILE} can't be opened: {e}")
+
+@jobs.command()
+@click.option("--interval", type=float, default=5, show_default=True, help="Seconds between polls")
+@click.option("--timeout", type=int, default=600, show_default=True, help="Seconds to watch before giving up")
+@click.option("--once", is_flag=True, help="Poll once and exit")
+def watch(interval, timeout, once):
+    """Poll every pending job (one batched call per service and tick) until all are done"""
+    start = time.monotonic()
+    backoff = AdaptiveBackoff() # get_change calls share route53's request rate
+    latencies = []
+    if not pending():
+        click.echo("No pending jobs")
+        return
+    while True:
+        for job_id, resource_id, state, latency, job_done in tick(backoff):
+            latencies.append(latency)
+            click.echo(f"job {job_id}: {resource_id} is {state} ({latency:.1f}s after submit)")
+            if job_done:
+                click.echo(f"job {job_id} done")
+        left = pending()
+        if not left:
+            break
+        if once:
+            click.echo(f"{len(left)} items still pending (annaws jobs list)")
+            break
+        if time.monotonic() - start + interval > timeout:
+            click.echo(f"Timed out, {len(left)} items still pending (annaws jobs list, annaws jobs clear --all drops them)")
+            break
+        time.sleep(interval)
+    if latencies:
+        latencies.sort()
+        click.echo(f"{len(latencies)} finished, latency min {latencies[0]:.1f}s, "
+                   f"median {latencies[len(latencies) // 2]:.1f}s, max {latencies[-1]:.1f}s (to within --interval)")
+
+@jobs.command(name="list")
+@click.option("--pending", "pending_only", is_flag=True, help="Only jobs that aren't done")
+def list_jobs(pending_only):
+    """Show the recorded jobs and how long each item took (no AWS calls)"""
+    rows = jobs_list()
+    if pending_only:
+        rows = [(job, items) for job, items in rows if job[6] is None]
+    if not rows:
+        click.echo("No jobs")
+        return
+    for (job_id, region, kind, command, target, submitted, finished), items in rows:
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(submitted))
+        status = f"done in {finished - submitted:.1f}s" if finished else f"{sum(done is None for _, _, done in items)} pending"
+        click.echo(f"job {job_id}: {command} -> {target}{f' ({region})' if region else ''}, {started}, {status}")
+        for resource_id, state, done in items:
+            click.echo(f"  {resource_id}  " + (f"{state} after {done - submitted:.1f}s" if done else "pending"))
+
+@jobs.command(name="clear")
+@click.option("--all", "everything", is_flag=True, help="Also drop pending jobs (e.g. instances stopped before they ran)")
+def clear_jobs(everything):
+    """Forget the finished jobs (no AWS calls)"""
+    click.echo(f"Removed {clear(everything)} jobs")
@@ -1,6 +1,10 @@
-import click, uuid, re
+import click, uuid, re, csv, io, ipaddress, json, os, queue, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
-from .globals import TAGS, region, route53_client
+from .globals import get_tags, get_region, route53_client, AdaptiveBackoff, max_workers
+from . import aio, inventory, jobs
+
+TAGS_BATCH = 10 # max zone ids per list_tags_for_resources call
 
 @click.group()
 def route53():
@@ -9,43 +13,497 @@ def route53():
 
 # ------------------------------------------------------------- Helpers ------------------------------------------------------------
 
-def annaws_route53():
-    hosted_zones_resp = route53_client.list_hosted_zones()
-    all_hosted_zones = hosted_zones_resp.get("HostedZones", [])
-    annaws_zones = []
-    zone_tags_dict = {}
-    for zone in all_hosted_zones:
+# all hosted zones of the account, every list_hosted_zones page
+def iter_hosted_zones():
+    for page in route53_client.get_paginator("list_hosted_zones").paginate():
+        yield from page["HostedZones"]
+
+# tags of up to 10 zones in one ListTagsForResources call: {zone_id: {key: value}}
+def zones_tags(zone_ids, backoff=None):
+    response = (backoff or AdaptiveBackoff()).call(
+        route53_client.list_tags_for_resources,
+        ResourceType='hostedzone',
+        ResourceIds=zone_ids
+    )
+    return {
+        tag_set["ResourceId"]: {t["Key"]: t["Value"] for t in tag_set.get("Tags", [])} #convert tags list to dict for access
+        for tag_set in response["ResourceTagSets"]
+    }
+
+# zones_tags, but a batch failing because of one zone (unknown id, deleted since it was listed) is
+# asked again zone by zone; zones that still fail are left out (so they count as not annaws-cli's)
+def zones_tags_or_each(zone_ids, backoff=None):
+    backoff = backoff or AdaptiveBackoff()
+    try:
+        return zones_tags(zone_ids, backoff)
+    except ClientError:
+        tags = {}
+        for zone_id in zone_ids:
+            try:
+                tags.update(zones_tags([zone_id], backoff))
+            except ClientError:
+                pass
+        return tags
+
+def zone_record(zone, zone_id):
+    return {
+        "Id": zone_id,
+        "Name":  zone["Name"],
+        "Private": zone["Config"].get("PrivateZone", False),
+        "Comment": zone["Config"].get("Comment", ""),
+        "Records": zone.get("ResourceRecordSetCount", 0)
+    }
+
+# lists every hosted zone and checks the tags of the ones the inventory doesn't know (all with full=True),
+# 10 zones per call spread over a thread pool, then rewrites the inventory.
+# Returns the annaws-cli zone records (list order) and the tag calls made
+def scan_zones(full=True, workers=None):
+    indexed = {} if full else inventory.known("route53")
+    zones = list(iter_hosted_zones())
+    new = [zone for zone in zones if zone["Id"].split("/")[-1] not in indexed]
+    batches = [new[start:start + TAGS_BATCH] for start in range(0, len(new), TAGS_BATCH)]
+    id_batches = [[z["Id"].split("/")[-1] for z in batch] for batch in batches]
+    if aio.enabled(): # --engine async: every batch on one event loop
+        batch_tags = aio.zones_tags(id_batches, workers)
+    else:
+        backoff = AdaptiveBackoff() # route53 allows few requests per second, all threads slow down together
+        with ThreadPoolExecutor(max_workers=max(1, workers or max_workers())) as pool:
+            batch_tags = list(pool.map(lambda zone_ids: zones_tags_or_each(zone_ids, backoff), id_batches))
+    tags = {}
+    for batch_tag in batch_tags:
+        tags.update(batch_tag)
+
+    annaws_zones, not_owned = [], []
+    for zone in zones:
         zone_id = zone["Id"].split("/")[-1]
-        zone_tags = route53_client.list_tags_for_resource(
-            ResourceType='hostedzone',
-            ResourceId=zone_id
-        )["ResourceTagSet"]["Tags"]
-        #zone_tags_dict = {t["Key"]: t["Value"] for t in zone_tags} #convert tags list to dict for access
-        for tag in zone_tags:
-                key = tag["Key"]
-                value = tag["Value"]
-                zone_tags_dict[key] = value
-        if zone_tags_dict.get("CreatedBy") == "annaws-cli":
-            annaws_zones.append({
-                "Id": zone_id,
-                "Name":  zone["Name"],
-                #"Private": zone["Config"]["PrivateZone"],
-                "Private": zone["Config"].get("PrivateZone", False),
-                #"Comment": zone["Config"]["Comment"],
-                "Comment": zone["Config"].get("Comment", ""),
-                "Records": zone.get("ResourceRecordSetCount", 0)
-            })
+        owned = indexed[zone_id][0] if zone_id in indexed else tags.get(zone_id, {}).get("CreatedBy") == "annaws-cli" # each zone is checked against its own tags only
+        if owned:
+            annaws_zones.append(zone_record(zone, zone_id)) # fresh record counts even for indexed zones
+        else:
+            not_owned.append(zone_id)
+    inventory.replace("route53", [(zone["Id"], zone) for zone in annaws_zones], not_owned)
+    return annaws_zones, len(batches)
 
-    if not annaws_zones:
-        click.echo("No hosted zones created by annaws-cli found.")
-        return
-    return annaws_zones
+def refresh_zone_inventory(full=False, workers=None): # annaws inventory refresh
+    annaws_zones, calls = scan_zones(full, workers)
+    return len(annaws_zones), calls
+
+# annaws-cli hosted zones (list order): from the inventory when it's recent, else a full tag scan
+def annaws_route53(workers=None):
+    indexed = inventory.owned("route53")
+    if indexed is not None:
+        return indexed
+    return scan_zones(workers=workers)[0]
+
+def dns_name(name): # "API.Example.com" -> "api.example.com." (how route53 returns names)
+    name = name.strip().lower()
+    return name if name.endswith(".") else name + "."
+
+# route53 sorts record sets by name with the labels reversed (api.example.com. -> com.example.api)
+def reversed_labels(name):
+    return ".".join(reversed(dns_name(name).rstrip(".").split(".")))
+
+def in_subtree(name, subtree): # name is subtree itself or below it
+    name, subtree = dns_name(name), dns_name(subtree)
+    return name == subtree or name.endswith("." + subtree)
+
+# list_resource_record_sets arguments for one zone, and the reversed name where listing can stop.
+# with subtree, listing starts at that name (StartRecordName) and stops once past it in route53's order
+def record_query(zone_id, subtree=None):
+    kwargs = {"HostedZoneId": zone_id}
+    stop_key = None
+    if subtree:
+        kwargs["StartRecordName"] = dns_name(subtree)
+        stop_key = reversed_labels(subtree) + "/" # "/" sorts right after ".", so every name below subtree is smaller
+    return kwargs, stop_key
+
+# the wanted records of one page, and whether the listing is finished
+def page_records(page, subtree=None, record_type=None, stop_key=None):
+    records = []
+    for record in page["ResourceRecordSets"]:
+        if stop_key and reversed_labels(record["Name"]) >= stop_key:
+            return records, True
+        if subtree and not in_subtree(record["Name"], subtree):
+            continue
+        if record_type and record["Type"] != record_type:
+            continue
+        records.append(record)
+    return records, not page.get("IsTruncated")
+
+def next_page_query(kwargs, page): # NextRecordName/Type/Identifier -> Start* for the next call
+    kwargs["StartRecordName"] = page["NextRecordName"]
+    kwargs["StartRecordType"] = page["NextRecordType"]
+    kwargs.pop("StartRecordIdentifier", None)
+    if "NextRecordIdentifier" in page:
+        kwargs["StartRecordIdentifier"] = page["NextRecordIdentifier"]
+
+# record sets of one zone, following NextRecordName/NextRecordType pages
+def iter_record_sets(zone_id, subtree=None, record_type=None):
+    kwargs, stop_key = record_query(zone_id, subtree)
+    backoff = AdaptiveBackoff()
+    while True:
+        page = backoff.call(route53_client.list_resource_record_sets, **kwargs)
+        records, finished = page_records(page, subtree, record_type, stop_key)
+        yield from records
+        if finished:
+            return
+        next_page_query(kwargs, page)
+
+_DONE = object()
+
+# runs fetch(zone) for several zones at once and yields (zone, item) zone after zone, in zone order,
+# each zone's items as soon as they arrive (later zones are prefetched into bounded queues)
+def stream_per_zone(zones, fetch, workers=None, buffer_size=1000):
+    stop = threading.Event()
+
+    def fill(zone, out):
+        try:
+            for item in fetch(zone):
+                while not stop.is_set():
+                    try:
+                        out.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            out.put(_DONE)
+        except Exception as e:
+            out.put(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or max_workers())) as pool:
+        queues = []
+        for zone in zones:
+            out = queue.Queue(maxsize=buffer_size)
+            pool.submit(fill, zone, out)
+            queues.append((zone, out))
+        try:
+            for zone, out in queues:
+                while True:
+                    item = out.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield zone, item
+        finally:
+            stop.set() # stops the fillers if the consumer quits early
+            for _, out in queues: # unblock fillers stuck on a full queue
+                while not out.empty():
+                    out.get_nowait()
+
+def record_values(record):
+    if "ResourceRecords" in record:
+        return [val["Value"] for val in record["ResourceRecords"]]
+    if "AliasTarget" in record:
+        return [record["AliasTarget"]["DNSName"]]
+    return []
 
 def validate_domain(domain_name):
     pattern = r"^(?!-)[A-Za-z0-9-]{1,63}(?<!-)(\.[A-Za-z]{2,})+$"
     if not re.match(pattern, domain_name):
         raise click.BadParameter(f"Invalid domain name: {domain_name}")
 
+# annaws-cli zones among zone_ids, checking only those zones (10 per call) instead of scanning the account;
+# zones the inventory knows need no call
+def owned_zone_ids(zone_ids):
+    zone_ids = sorted({z.split("/")[-1] for z in zone_ids})
+    owned = set()
+    unknown = []
+    for zone_id in zone_ids:
+        indexed = inventory.lookup("route53", zone_id)
+        if indexed is None:
+            unknown.append(zone_id)
+        elif indexed[0]:
+            owned.add(zone_id)
+    zone_ids = unknown
+    backoff = AdaptiveBackoff()
+    for start in range(0, len(zone_ids), TAGS_BATCH):
+        tags = zones_tags_or_each(zone_ids[start:start + TAGS_BATCH], backoff)
+        owned.update(z for z, t in tags.items() if t.get("CreatedBy") == "annaws-cli")
+    return owned
+
+# ------------------------------------------------------------- Change files -------------------------------------------------------------
+
+ACTIONS = {"create": "CREATE", "update": "UPSERT", "upsert": "UPSERT", "delete": "DELETE"} #UPSERT like update but also overwrite if exists
+RECORD_TYPES = {"A", "AAAA", "CAA", "CNAME", "DS", "HTTPS", "MX", "NAPTR", "NS", "PTR", "SOA", "SPF", "SRV", "SSHFP", "SVCB", "TLSA", "TXT"}
+
+# ChangeResourceRecordSets limits (UPSERT counts twice for records and characters)
+MAX_BATCH_CHANGES = 1000
+MAX_BATCH_RECORDS = 1000
+MAX_BATCH_VALUE_CHARS = 32000
+
+def detect_format(path, text):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".yaml", ".yml"):
+        return "yaml"
+    if extension in (".json", ".csv"):
+        return extension[1:]
+    first = text.lstrip()[:1]
+    if first in ("[", "{"):
+        return "json"
+    if text.lstrip().lower().startswith(("action,", "name,")):
+        return "csv"
+    return "yaml"
+
+# rows (dicts) of a YAML/JSON/CSV file, "-" reads stdin. CSV "values" are separated by "|"
+def load_rows(path, file_format="auto"):
+    if path == "-":
+        text = click.get_text_stream("stdin").read()
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    if file_format == "auto":
+        file_format = detect_format(path, text)
+    if file_format == "csv":
+        rows = []
+        for row in csv.DictReader(io.StringIO(text)):
+            row = {k.strip().lower(): v.strip() for k, v in row.items() if k and v and v.strip()}
+            if "values" in row:
+                row["values"] = [v.strip() for v in row["values"].split("|") if v.strip()]
+            rows.append(row)
+        return rows
+    if file_format == "yaml":
+        try:
+            import yaml
+        except ImportError:
+            raise click.ClickException("YAML files need PyYAML: pip install pyyaml (or use JSON/CSV)")
+        data = yaml.safe_load(text)
+        if data is None: # empty file: no records (a zone holding only its apex is a valid desired state)
+            data = []
+    else:
+        data = json.loads(text)
+    if isinstance(data, dict): # {"changes": [...]} / {"records": [...]}
+        data = data.get("changes", data.get("records", []))
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise click.ClickException(f"{path}: expected a list of records")
+    return data
+
+def validate_record_name(name):
+    labels = dns_name(name).rstrip(".").split(".")
+    return len(name) <= 255 and all(0 < len(label) <= 63 for label in labels)
+
+# validated ResourceRecordSet from a file row, or the list of what's wrong with it
+def record_set_from_row(row):
+    errors = []
+    name = str(row.get("name", "")).strip()
+    record_type = str(row.get("type", "")).strip().upper()
+    if not name or not validate_record_name(name):
+        errors.append(f"invalid name {name!r}")
+    if record_type not in RECORD_TYPES:
+        errors.append(f"invalid type {record_type!r}")
+    record_set = {"Name": dns_name(name) if name else name, "Type": record_type}
+    if row.get("set_identifier"):
+        record_set["SetIdentifier"] = str(row["set_identifier"])
+        if row.get("weight") is not None:
+            try:
+                record_set["Weight"] = int(row["weight"])
+                if not 0 <= record_set["Weight"] <= 255:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append(f"invalid weight {row.get('weight')!r} (0-255)")
+
+    alias_dns, alias_zone = row.get("alias_dns"), row.get("alias_zone")
+    values = row.get("values", row.get("value"))
+    if alias_dns or alias_zone: # alias record (A --> ALB, CloudFront)
+        if not (alias_dns and alias_zone):
+            errors.append("alias records need alias_dns and alias_zone")
+        record_set["AliasTarget"] = {
+            "HostedZoneId": alias_zone,
+            "DNSName": alias_dns,
+            "EvaluateTargetHealth": str(row.get("evaluate_health", False)).lower() in ("true", "1", "yes")
+        }
+    else: # standard record (A, CNAME, MX, etc.)
+        values = [values] if isinstance(values, (str, int)) else list(values or [])
+        values = [str(v) for v in values]
+        if not values:
+            errors.append("values are required for standard records")
+        try:
+            ttl = int(row.get("ttl", 300))
+            if not 0 <= ttl <= 2147483647:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append(f"invalid ttl {row.get('ttl')!r}")
+            ttl = 300
+        for value in values:
+            try:
+                if record_type == "A":
+                    ipaddress.IPv4Address(value)
+                elif record_type == "AAAA":
+                    ipaddress.IPv6Address(value)
+            except ValueError:
+                errors.append(f"{value!r} is not a valid {record_type} value")
+        if record_type == "CNAME" and len(values) > 1:
+            errors.append("CNAME records take exactly one value")
+        record_set["TTL"] = ttl
+        record_set["ResourceRecords"] = [{"Value": v} for v in values]
+    return record_set, errors
+
+# (zone id, Change) from a change file row, or the list of what's wrong with it
+def change_from_row(row, default_zone=None):
+    record_set, errors = record_set_from_row(row)
+    action = ACTIONS.get(str(row.get("action", "")).strip().lower())
+    if action is None and str(row.get("action", "")).strip().upper() in ACTIONS.values():
+        action = str(row["action"]).strip().upper()
+    if action is None:
+        errors.append(f"invalid action {row.get('action')!r} (create, update, delete)")
+    zone_id = str(row.get("zone") or default_zone or "").split("/")[-1]
+    if not zone_id:
+        errors.append("zone is missing (add a zone column or use --zone)")
+    return zone_id, {"Action": action, "ResourceRecordSet": record_set}, errors
+
+def change_cost(change): # (records, value characters) this change counts for in a batch
+    record_set = change["ResourceRecordSet"]
+    values = [r["Value"] for r in record_set.get("ResourceRecords", [])]
+    weight = 2 if change["Action"] == "UPSERT" else 1
+    return weight * max(1, len(values)), weight * sum(len(v) for v in values)
+
+# packs changes, in order, into as few ChangeBatches as the limits allow. Order is kept
+# (not bin-packed) because a batch may delete and re-create the same record set
+def pack_changes(changes):
+    batches, batch, records, chars = [], [], 0, 0
+    for change in changes:
+        change_records, change_chars = change_cost(change)
+        if batch and (len(batch) + 1 > MAX_BATCH_CHANGES or records + change_records > MAX_BATCH_RECORDS
+                      or chars + change_chars > MAX_BATCH_VALUE_CHARS):
+            batches.append(batch)
+            batch, records, chars = [], 0, 0
+        batch.append(change)
+        records += change_records
+        chars += change_chars
+    if batch:
+        batches.append(batch)
+    return batches
+
+# submits every zone's batches (in order within a zone, zones in parallel).
+# returns [(zone id, ChangeInfo, number of changes)] and [(zone id, error)]
+def submit_change_batches(batches_by_zone, comment, workers=None):
+    def submit_zone(zone_id, batches):
+        submitted = []
+        backoff = AdaptiveBackoff()
+        for number, batch in enumerate(batches, 1):
+            try:
+                response = backoff.call(
+                    route53_client.change_resource_record_sets,
+                    HostedZoneId=zone_id,
+                    ChangeBatch={"Comment": f"{comment} ({number}/{len(batches)})", "Changes": batch}
+                )
+            except ClientError as e: # later batches may depend on this one, stop this zone here
+                return submitted, e
+            submitted.append((zone_id, response["ChangeInfo"], len(batch)))
+        return submitted, None
+
+    results, errors = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers or max_workers())) as pool:
+        futures = {zone_id: pool.submit(submit_zone, zone_id, batches) for zone_id, batches in batches_by_zone.items()}
+        for zone_id, future in futures.items():
+            submitted, error = future.result()
+            results.extend(submitted)
+            if error:
+                errors.append((zone_id, error))
+    return results, errors
+
+# one poll loop for many changes (route53 has no batch GetChange, each pending id is asked once per tick).
+# yields (change id, seconds until INSYNC)
+def wait_for_changes(change_ids, interval=5, timeout=600):
+    pending = set(change_ids)
+    start = time.monotonic()
+    backoff = AdaptiveBackoff()
+    while pending:
+        for change_id in sorted(pending):
+            status = backoff.call(route53_client.get_change, Id=change_id)["ChangeInfo"]["Status"]
+            if status == "INSYNC":
+                pending.discard(change_id)
+                yield change_id, time.monotonic() - start
+        if pending:
+            if time.monotonic() - start + interval > timeout:
+                raise TimeoutError(f"Timed out waiting for {', '.join(sorted(pending))} to be INSYNC")
+            time.sleep(interval)
+
+# ------------------------------------------------------------- Plan (desired state diff) -------------------------------------------------------------
+
+def record_key(record_set): # identity of a record set inside a zone
+    name = dns_name(record_set["Name"]).replace("\\052", "*") # route53 returns "*" escaped
+    return name, record_set["Type"], record_set.get("SetIdentifier")
+
+def record_body(record_set): # everything but the identity, normalized so equal records compare equal
+    body = {k: v for k, v in record_set.items() if k not in ("Name", "Type", "SetIdentifier")}
+    if "ResourceRecords" in body:
+        body["ResourceRecords"] = sorted(r["Value"] for r in body["ResourceRecords"])
+    if "AliasTarget" in body:
+        body["AliasTarget"] = dict(body["AliasTarget"], DNSName=dns_name(body["AliasTarget"]["DNSName"]))
+    return body
+
+# minimal change list turning current into desired (both lists of record sets), indexed by
+# (name, type, set identifier): deletes first, so a name can switch type in the same apply.
+# the apex SOA/NS records are never deleted
+def diff_record_sets(current, desired, apex, delete=True):
+    current_by_key = {record_key(r): r for r in current}
+    desired_by_key = {record_key(r): r for r in desired}
+    deletes, creates, upserts = [], [], []
+    for key, want in desired_by_key.items():
+        have = current_by_key.get(key)
+        if have is None:
+            creates.append({"Action": "CREATE", "ResourceRecordSet": want})
+        elif record_body(have) != record_body(want):
+            upserts.append({"Action": "UPSERT", "ResourceRecordSet": want})
+    if delete:
+        for key, have in current_by_key.items():
+            if key in desired_by_key or (key[0] == dns_name(apex) and key[1] in ("SOA", "NS")):
+                continue
+            deletes.append({"Action": "DELETE", "ResourceRecordSet": have}) # delete needs the exact current record
+    return deletes + creates + upserts
+
+# desired record sets of a file for one zone, or the list of what's wrong with it
+def desired_record_sets(path, file_format, apex):
+    desired, problems, seen = [], [], set()
+    for number, row in enumerate(load_rows(path, file_format), 1):
+        record_set, errors = record_set_from_row(row)
+        if not errors and not in_subtree(record_set["Name"], apex):
+            errors.append(f"not inside the zone {apex}")
+        if not errors and record_key(record_set) in seen:
+            errors.append("listed more than once")
+        seen.add(record_key(record_set))
+        problems.extend(f"  record {number} ({row.get('name', '?')}): {e}" for e in errors)
+        desired.append(record_set)
+    return desired, problems
+
+PLAN_SYMBOLS = {"CREATE": "+", "UPSERT": "~", "DELETE": "-"}
+
+def echo_plan(changes):
+    for change in changes:
+        record_set = change["ResourceRecordSet"]
+        set_id = f" [{record_set['SetIdentifier']}]" if record_set.get("SetIdentifier") else ""
+        ttl = f" ttl={record_set['TTL']}" if "TTL" in record_set else ""
+        click.echo(f"  {PLAN_SYMBOLS[change['Action']]} {change['Action']:<6} {record_set['Name']} {record_set['Type']}{set_id}{ttl} {record_values(record_set)}")
+    counts = {action: sum(1 for c in changes if c["Action"] == action) for action in PLAN_SYMBOLS}
+    click.echo(f"Plan: {counts['CREATE']} to create, {counts['UPSERT']} to update, {counts['DELETE']} to delete")
+
+# fetch the zone once and compute its plan; returns the changes or None (problems were printed)
+def plan_zone(zone_id, desired_file, file_format, delete):
+    zone_id = zone_id.split("/")[-1]
+    if zone_id not in owned_zone_ids([zone_id]):
+        click.echo("The hosted zone wasn't created by annaws-cli")
+        return None
+    current = list(iter_record_sets(zone_id))
+    apex = next((r["Name"] for r in current if r["Type"] == "SOA"), None)
+    desired, problems = desired_record_sets(desired_file, file_format, apex)
+    if problems:
+        click.echo("The desired state file has errors:")
+        click.echo("\n".join(problems))
+        return None
+    start = time.perf_counter()
+    changes = diff_record_sets(current, desired, apex, delete)
+    click.echo(f"{len(current)} current / {len(desired)} desired record sets, diff computed in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return changes
+
+def plan_options(command):
+    command = click.option("--no-delete", is_flag=True, help="Keep records that are not in the file")(command)
+    command = click.option("--format", "file_format", type=click.Choice(['auto', 'yaml', 'json', 'csv']), default='auto', help="Desired state file format (default: from the extension)")(command)
+    command = click.argument("desired_file", type=click.Path(exists=True, dir_okay=False, allow_dash=True))(command)
+    command = click.argument("zone_id")(command)
+    return command
+
 # ------------------------------------------------------------- annaws route53 create-zones -------------------------------------------------------------
 
 @route53.command()
@@ -53,7 +511,8 @@ def validate_domain(domain_name):
 @click.option("--private", is_flag=True, help="For private hosted zones, requires --vpc-id")
 @click.option("--vpc-id", default=None, help="ID of the VPC (required for private zones)")  
 @click.option("--commant", default="Created by annaws-cli", help="Optional comment about the hosted zone")
-def create_zones(domain_name, private, vpc_id, commant):
+@click.option("--track", is_flag=True, help="Record the change as a job to follow with annaws jobs watch")
+def create_zones(domain_name, private, vpc_id, commant, track):
     """Create a new Route53 hosted zone"""
 ###########################################################################make sure validate domain works
     validate_domain(domain_name)
@@ -73,7 +532,7 @@ def create_zones(domain_name, private, vpc_id, commant):
             return
         route53_args["VPC"] = {
             "VPCId": vpc_id,
-            "VPCRegion": region
+            "VPCRegion": get_region()
         }
 
     try:
@@ -83,11 +542,15 @@ def create_zones(domain_name, private, vpc_id, commant):
         route53_client.change_tags_for_resource(
             ResourceType='hostedzone',
             ResourceId=zone_id,
-            AddTags=TAGS
+            AddTags=get_tags()
         )
+        inventory.add("route53", zone_id, zone_record(hosted_zone["HostedZone"], zone_id))
         click.echo(f"Hosted zone {domain_name} created with ID:{zone_id}")
     except ClientError as e:
         click.echo(f"Error creating hosted zone: {e}")
+        return
+    if track:
+        jobs.record("route53", f"route53 create-zones {domain_name}", "INSYNC", [hosted_zone["ChangeInfo"]["Id"]])
 
 # ------------------------------------------------------------- annaws route53 manage-records -------------------------------------------------------------
 
@@ -101,18 +564,15 @@ def create_zones(domain_name, private, vpc_id, commant):
 @click.option("--alias-dns", help="DNS name for alias target")
 @click.option("--alias-zone", help="Hosted zone ID for alias target")
 @click.option("--evaluate-health", type=bool, default=False, help="Whether to evaluate target health (only for alias records)")
-def manage_records(action, zone_id, name, record_type, value, ttl, alias_dns, alias_zone, evaluate_health):
+@click.option("--track", is_flag=True, help="Record the change as a job to follow with annaws jobs watch")
+def manage_records(action, zone_id, name, record_type, value, ttl, alias_dns, alias_zone, evaluate_health, track):
     """Manage DNS records inside annaws-cli created hosted zones."""
     if not value and not alias_dns:
         click.echo("--value is required for standard records")
         return
 
     #Check if zone created by annaws-cli
-    annaws_zones = annaws_route53()
-    zone_ids = []
-    for z in annaws_zones:
-        zone_ids.append(z["Id"])
-    if zone_id not in zone_ids:
+    if zone_id not in owned_zone_ids([zone_id]):
         click.echo("The hosted zone wasn't created by annaws-cli")
         return
     
@@ -152,6 +612,102 @@ def manage_records(action, zone_id, name, record_type, value, ttl, alias_dns, al
         click.echo(f"The {action} was submitted, it's on {change_info['Status']}. Changeinfo ID:{change_info['Id']} ")
     except ClientError as e:
         click.echo(f"Error {action} the record: {e}")
+        return
+    if track:
+        jobs.record("route53", f"route53 manage-records {action} {name}", "INSYNC", [change_info["Id"]])
+
+# ------------------------------------------------------------- annaws route53 apply-changes -------------------------------------------------------------
+
+@route53.command(name="apply-changes")
+@click.argument("change_file", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "file_format", type=click.Choice(['auto', 'yaml', 'json', 'csv']), default='auto', help="Change file format (default: from the extension)")
+@click.option("--zone", "default_zone", default=None, help="Hosted zone Id for rows without a zone")
+@click.option("--wait", is_flag=True, help="Wait until every change is INSYNC")
+@click.option("--wait-interval", type=float, default=5, show_default=True, help="Seconds between change status polls")
+@click.option("--wait-timeout", type=int, default=600, show_default=True, help="Seconds to wait before giving up")
+@click.option("--track", is_flag=True, help="Record the change as a job to follow with annaws jobs watch")
+def apply_changes(change_file, file_format, default_zone, wait, wait_interval, wait_timeout, track):
+    """Apply a YAML/JSON/CSV file of DNS changes ("-" for stdin) in as few batches as possible"""
+    rows = load_rows(change_file, file_format)
+
+    # validate everything locally before calling route53
+    changes_by_zone, problems = {}, []
+    for number, row in enumerate(rows, 1):
+        zone_id, change, errors = change_from_row(row, default_zone)
+        problems.extend(f"  change {number} ({row.get('name', '?')}): {e}" for e in errors)
+        changes_by_zone.setdefault(zone_id, []).append(change)
+    if problems:
+        click.echo("The change file has errors, nothing was applied:")
+        click.echo("\n".join(problems))
+        return
+    if not changes_by_zone:
+        click.echo("No changes in the file")
+        return
+
+    not_owned = set(changes_by_zone) - owned_zone_ids(changes_by_zone)
+    if not_owned:
+        click.echo(f"The hosted zone/s {', '.join(sorted(not_owned))} weren't created by annaws-cli, nothing was applied")
+        return
+
+    batches_by_zone = {zone_id: pack_changes(changes) for zone_id, changes in changes_by_zone.items()}
+    batch_count = sum(len(b) for b in batches_by_zone.values())
+    click.echo(f"Applying {len(rows)} changes to {len(batches_by_zone)} zone/s in {batch_count} batch/es")
+    submitted, errors = submit_change_batches(batches_by_zone, "Managed by annaws-cli (apply-changes)")
+    for zone_id, change_info, change_count in submitted:
+        click.echo(f"  {zone_id}: {change_count} changes submitted, it's on {change_info['Status']}. Changeinfo ID:{change_info['Id']}")
+    for zone_id, error in errors:
+        click.echo(f"  {zone_id}: Error applying the changes (later batches of this zone were skipped): {error}")
+
+    if submitted and track and not wait: # followed later by annaws jobs watch
+        jobs.record("route53", f"route53 apply-changes {change_file}", "INSYNC", [c["Id"] for _, c, _ in submitted])
+    elif submitted and wait:
+        try:
+            for change_id, waited in wait_for_changes([c["Id"] for _, c, _ in submitted], wait_interval, wait_timeout):
+                click.echo(f"  {change_id} is INSYNC ({waited:.1f}s)")
+        except TimeoutError as e:
+            click.echo(str(e))
+
+# ------------------------------------------------------------- annaws route53 plan / apply -------------------------------------------------------------
+
+@route53.command()
+@plan_options
+def plan(zone_id, desired_file, file_format, no_delete):
+    """Show the changes that would make a zone match a desired state file"""
+    changes = plan_zone(zone_id, desired_file, file_format, not no_delete)
+    if changes is not None:
+        echo_plan(changes)
+
+@route53.command()
+@plan_options
+@click.option("--yes", is_flag=True, help="Don't ask for confirmation")
+@click.option("--wait", is_flag=True, help="Wait until the changes are INSYNC")
+@click.option("--track", is_flag=True, help="Record the change as a job to follow with annaws jobs watch")
+def apply(zone_id, desired_file, file_format, no_delete, yes, wait, track):
+    """Make a zone match a desired state file, changing only what differs"""
+    changes = plan_zone(zone_id, desired_file, file_format, not no_delete)
+    if changes is None:
+        return
+    echo_plan(changes)
+    if not changes:
+        click.echo("Nothing to change")
+        return
+    if not yes and not click.confirm("Apply these changes?"):
+        return
+
+    zone_id = zone_id.split("/")[-1]
+    submitted, errors = submit_change_batches({zone_id: pack_changes(changes)}, "Managed by annaws-cli (apply)")
+    for _, change_info, change_count in submitted:
+        click.echo(f"  {change_count} changes submitted, it's on {change_info['Status']}. Changeinfo ID:{change_info['Id']}")
+    for _, error in errors:
+        click.echo(f"Error applying the changes (later batches were skipped): {error}")
+    if submitted and track and not wait:
+        jobs.record("route53", f"route53 apply {zone_id}", "INSYNC", [c["Id"] for _, c, _ in submitted])
+    elif submitted and wait:
+        try:
+            for change_id, waited in wait_for_changes([c["Id"] for _, c, _ in submitted]):
+                click.echo(f"  {change_id} is INSYNC ({waited:.1f}s)")
+        except TimeoutError as e:
+            click.echo(str(e))
 
 # ------------------------------------------------------------- annaws route53 list-zones -------------------------------------------------------------
 
@@ -168,22 +724,31 @@ def list_hosted_zones():
 # ------------------------------------------------------------- annaws route53 list-record -------------------------------------------------------------
 
 @route53.command(name="list-records")
-def list_resource_record_sets():
+@click.option("--zone", "zones", multiple=True, help="Only this hosted zone, by Id or name (can repeat)")
+@click.option("--type", "record_type", default=None, help="Only records of this type (A, CNAME, ...)")
+@click.option("--name-prefix", default=None,
+              help="Only this name and the names below it, e.g. api.example.com (read from that point of the zone, not the whole zone)")
+@click.option("--workers", type=click.IntRange(1, 512), default=None, help="Zones fetched at the same time (default: --max-workers)")
+def list_resource_record_sets(zones, record_type, name_prefix, workers):
     """List all DNS records in hosted zones created by annaws-cli"""
     annaws_zones = annaws_route53()
+    if zones:
+        wanted = {z.split("/")[-1] for z in zones} | {dns_name(z) for z in zones}
+        annaws_zones = [z for z in annaws_zones if z["Id"] in wanted or z["Name"] in wanted]
+    if name_prefix: # zones that can hold names under the prefix (the prefix is inside the zone, or the zone inside it)
+        annaws_zones = [z for z in annaws_zones if in_subtree(name_prefix, z["Name"]) or in_subtree(z["Name"], name_prefix)]
     if not annaws_zones:
         click.echo("No hosted zones created by annaws-cli found")
         return
-    for zone in annaws_zones:
-        resource_records = route53_client.list_resource_record_sets(HostedZoneId=zone["Id"])
-        for record in resource_records["ResourceRecordSets"]:
-            record_name = record["Name"]
-            record_type = record["Type"]
-            values = []
-            if "ResourceRecords" in record:
-                for val in record["ResourceRecords"]:
-                    values.append(val["Value"])
-            elif "AliasTarget" in record:
-                values = [record["AliasTarget"]["DNSName"]]
-            click.echo(f"  Zone-Name: {record_name}, Type: ({record_type}), Values: {values}")
 
+    def query(zone):
+        subtree = name_prefix if name_prefix and in_subtree(name_prefix, zone["Name"]) else None
+        return zone["Id"], subtree, record_type.upper() if record_type else None
+
+    if aio.enabled(): # --engine async: all zones fetched on one event loop, then printed in zone order
+        results = aio.record_sets([query(zone) for zone in annaws_zones], workers)
+        pairs = ((zone, record) for zone, records in zip(annaws_zones, results) for record in records)
+    else:
+        pairs = stream_per_zone(annaws_zones, lambda zone: iter_record_sets(*query(zone)), workers)
+    for zone, record in pairs:
+        click.echo(f"  Zone-Name: {record['Name']}, Type: ({record['Type']}), Values: {record_values(record)}")
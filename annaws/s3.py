@@ -1,26 +1,506 @@
-import click, uuid, json, os
-from .globals import s3_client, s3_resource, OWNER, region, TAGS
+import click, uuid, json, os, glob, hashlib, math, mmap, threading, time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from . import aio, inventory
+from concurrent.futures import ThreadPoolExecutor
+from .globals import client, s3_client, s3_resource, get_owner, get_region, get_tags, AdaptiveBackoff, max_workers, \
+    for_regions, region_bound, regions_option, target_regions
 from botocore.exceptions import ClientError
+from .cache import CACHE_DIR, write_json_atomic
 
 def s3_name_fix(base_name):
     fixed_name = base_name.lower().replace("_","-")
-    return f"{OWNER}-{fixed_name}-{uuid.uuid4().hex[:6]}"
+    return f"{get_owner()}-{fixed_name}-{uuid.uuid4().hex[:6]}"
 
-def anna_s3_buckets():
-    all_buckets = s3_resource.buckets.all()
-    annaws_buckets = []
-    
-    for bucket in all_buckets:
-        bucket_tags_dict = {}
-        try: #skipps buckets without tags
-            bucket_tags = s3_client.get_bucket_tagging(Bucket=bucket.name) # get the bucket tags
-            for tag in bucket_tags["TagSet"]: 
-                bucket_tags_dict[tag["Key"]] = tag["Value"] #convert bucket tags list to dict for access
-            if bucket_tags_dict.get("CreatedBy") == "annaws-cli":
-                annaws_buckets.append(bucket)
+# all bucket names in the account (paginated), optionally only the ones starting with prefix
+# and/or the ones in region (filtered by S3 itself)
+def iter_bucket_names(prefix=None, region=None):
+    kwargs = {"BucketRegion": region} if region else {}
+    if s3_client.can_paginate("list_buckets"):
+        pages = s3_client.get_paginator("list_buckets").paginate(**kwargs)
+    else:
+        pages = [s3_client.list_buckets(**kwargs)]
+    for page in pages:
+        for bucket in page.get("Buckets", []):
+            if prefix is None or bucket["Name"].startswith(prefix):
+                yield bucket["Name"]
+
+# tags of one bucket as a dict, None when it has no tags / is not accessible
+def bucket_tags(bucket_name, backoff=None):
+    try:
+        bucket_tags = (backoff or AdaptiveBackoff()).call(s3_client.get_bucket_tagging, Bucket=bucket_name) # get the bucket tags
+    except ClientError:
+        return None #skipps buckets without tags
+    return {tag["Key"]: tag["Value"] for tag in bucket_tags["TagSet"]} #convert bucket tags list to dict for access
+
+# names of the annaws-cli buckets among names (same order), tag lookups fanned out over a thread pool
+def owned_bucket_names(names, workers=None):
+    if aio.enabled(): # --engine async: every tag lookup on one event loop
+        return aio.annaws_bucket_names(names, workers)
+    backoff = AdaptiveBackoff()
+    lookup = region_bound(lambda name: bucket_tags(name, backoff)) # --regions: this region's client, no redirects
+    with ThreadPoolExecutor(max_workers=max(1, workers or max_workers())) as pool:
+        all_tags = pool.map(lookup, names)
+        return [name for name, tags in zip(names, all_tags) if tags and tags.get("CreatedBy") == "annaws-cli"]
+
+# lists every bucket and checks the tags of the ones the inventory doesn't know (all with full=True),
+# then rewrites the inventory. Returns the annaws-cli bucket names (list order) and the tag lookups made
+def scan_buckets(full=True, workers=None):
+    indexed = {} if full else inventory.known("s3")
+    names = list(iter_bucket_names())
+    new = [name for name in names if name not in indexed]
+    new_owned = set(owned_bucket_names(new, workers))
+    owned = [name for name in names if (indexed[name][0] if name in indexed else name in new_owned)]
+    owned_set = set(owned)
+    inventory.replace(
+        "s3",
+        [(name, indexed[name][1] if name in indexed else {"Name": name}) for name in owned],
+        [name for name in names if name not in owned_set]
+    )
+    return owned, len(new)
+
+def refresh_bucket_inventory(full=False, workers=None): # annaws inventory refresh
+    owned, checked = scan_buckets(full, workers)
+    return len(owned), checked
+
+# annaws-cli buckets (same order as list_buckets): from the inventory when it's recent, else a full tag scan
+# owner_prefix=True skips buckets not named "{OWNER}-..." (see s3_name_fix) without fetching their tags
+def anna_s3_buckets(workers=None, owner_prefix=False):
+    prefix = f"{get_owner()}-" if owner_prefix else None
+    indexed = inventory.owned("s3")
+    if indexed is not None:
+        return [s3_resource.Bucket(b["Name"]) for b in indexed if prefix is None or b["Name"].startswith(prefix)]
+    if prefix is None:
+        names = scan_buckets(workers=workers)[0]
+    else: # partial scan, the inventory is left as it is
+        names = owned_bucket_names(list(iter_bucket_names(prefix)), workers)
+    return [s3_resource.Bucket(name) for name in names]
+
+# annaws-cli buckets of the current region (see globals.for_regions): ListBuckets filtered on the region,
+# then owned_names (the inventory's) or tag lookups decide which are annaws-cli's
+def region_bucket_names(owned_names=None, workers=None, prefix=None):
+    names = list(iter_bucket_names(prefix, region=get_region()))
+    if owned_names is not None:
+        return [name for name in names if name in owned_names]
+    return owned_bucket_names(names, workers)
+
+_bucket_checks = {} # bucket -> region if created by annaws-cli else None, for the rest of the process
+
+# checks only this bucket (2 calls, whatever the account size, none when the inventory knows it):
+# returns its region if it was created by annaws-cli, None if not / it doesn't exist / no access
+def annaws_bucket_region(bucket_name):
+    if bucket_name not in _bucket_checks:
+        indexed = inventory.lookup("s3", bucket_name)
+        if indexed is not None:
+            owned, data = indexed
+            _bucket_checks[bucket_name] = ((data or {}).get("Region") or get_region()) if owned else None
+            return _bucket_checks[bucket_name]
+        region = None
+        try:
+            head = s3_client.head_bucket(Bucket=bucket_name)
+            tags = bucket_tags(bucket_name)
+            if tags and tags.get("CreatedBy") == "annaws-cli":
+                headers = head["ResponseMetadata"]["HTTPHeaders"]
+                region = head.get("BucketRegion") or headers.get("x-amz-bucket-region") or get_region()
+            inventory.add("s3", bucket_name, {"Name": bucket_name, "Region": region} if region else None, owned=bool(region))
         except ClientError:
-            continue
-    return annaws_buckets
+            pass
+        _bucket_checks[bucket_name] = region
+    return _bucket_checks[bucket_name]
+
+# ------------------------------------------------------------- Transfers -------------------------------------------------------------
+
+def parse_size(ctx, param, value): # click callback: "8MB", "512KB", "1048576" -> bytes
+    if value is None:
+        return None
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "B": 1}
+    text = str(value).strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            text, multiplier = text[:-len(unit)], factor
+            break
+    else:
+        multiplier = 1
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        raise click.BadParameter(f"Invalid size: {value} (use e.g. 8MB, 512KB)")
+
+def human_size(num_bytes):
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(num_bytes) < 1024 or unit == "TiB":
+            return f"{num_bytes:.1f} {unit}" if unit != "B" else f"{num_bytes:.0f} B"
+        num_bytes /= 1024
+
+def percentile(sorted_values, pct): # nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def has_glob(path):
+    return any(ch in path for ch in "*?[")
+
+# streams (local path, key, size) for files, directories (walked recursively) and glob patterns,
+# without building the whole list first. One plain file keeps --key as its exact key,
+# otherwise --key is a prefix and directories keep their relative layout
+def iter_upload_files(paths, key=None):
+    single_file = len(paths) == 1 and os.path.isfile(paths[0]) and not has_glob(paths[0])
+    if single_file:
+        yield paths[0], key or os.path.basename(paths[0]), os.path.getsize(paths[0])
+        return
+
+    prefix = key.strip("/") + "/" if key else ""
+    for path in paths:
+        matches = glob.iglob(path, recursive=True) if has_glob(path) else [path]
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    dirs.sort()
+                    for file_name in sorted(files):
+                        local = os.path.join(root, file_name)
+                        relative = os.path.relpath(local, match).replace(os.sep, "/")
+                        yield local, prefix + relative, os.path.getsize(local)
+            elif os.path.isfile(match):
+                yield match, prefix + os.path.basename(match), os.path.getsize(match)
+            else:
+                click.echo(f"Skipping {match}: no such file or directory", err=True)
+
+class TransferStats:
+    """Live progress line (stderr) + per-file latencies for the final summary, shared by transfer threads"""
+    def __init__(self, verb="Uploaded", show_progress=True):
+        self.verb = verb
+        self.show_progress = show_progress
+        self.start = time.perf_counter()
+        self.bytes = 0
+        self.files = 0
+        self.latencies = []
+        self.errors = []
+        self._queued = {}
+        self._started = {}
+        self._last_print = 0.0
+        self._lock = threading.Lock()
+
+    # s3transfer subscriber callbacks (called from the transfer threads).
+    # a file's latency runs from its first transferred bytes, not from when it was queued
+    # (big trees wait in s3transfer's submission queue long before they start)
+    def on_queued(self, future, **kwargs):
+        self._queued[id(future)] = time.perf_counter()
+
+    def on_progress(self, future, bytes_transferred, **kwargs):
+        with self._lock:
+            self._started.setdefault(id(future), time.perf_counter())
+            self.bytes += bytes_transferred
+            self._print_progress()
+
+    def on_done(self, future, **kwargs):
+        with self._lock: # empty files never report progress: queued time instead
+            queued = self._queued.pop(id(future), self.start)
+            latency = time.perf_counter() - self._started.pop(id(future), queued)
+        try:
+            future.result()
+        except Exception as e:
+            with self._lock:
+                self.errors.append((future.meta.call_args.key, e))
+            return
+        with self._lock:
+            self.files += 1
+            self.latencies.append(latency)
+            self._print_progress()
+
+    def _print_progress(self, force=False):
+        now = time.perf_counter()
+        if not self.show_progress or (not force and now - self._last_print < 0.2):
+            return
+        self._last_print = now
+        rate = self.bytes / max(now - self.start, 1e-9)
+        click.echo(f"\r  {self.files} files, {human_size(self.bytes)}, {human_size(rate)}/s   ", nl=False, err=True)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        if self.show_progress:
+            self._print_progress(force=True)
+            click.echo("", err=True)
+        latencies = sorted(self.latencies)
+        click.echo(f"{self.verb} {self.files} files, {human_size(self.bytes)} in {elapsed:.2f}s "
+                   f"({human_size(self.bytes / max(elapsed, 1e-9))}/s)")
+        if latencies:
+            click.echo(f"  per-file latency: p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+                       f"p90 {percentile(latencies, 90) * 1000:.0f} ms, "
+                       f"p99 {percentile(latencies, 99) * 1000:.0f} ms, "
+                       f"max {latencies[-1] * 1000:.0f} ms")
+        for failed_key, error in self.errors:
+            click.echo(f"  FAILED {failed_key}: {error}", err=True)
+
+def transfer_config(chunk_size, multipart_threshold, concurrency):
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=chunk_size,
+        max_concurrency=concurrency or max_workers(), # parallel requests across all files and their parts
+        preferred_transfer_client="classic"
+    )
+
+# shared options of the commands that upload (upload-files, sync)
+def transfer_options(command):
+    options = [
+        click.option("--chunk-size", default="8MB", callback=parse_size, show_default=True, help="Multipart part size"),
+        click.option("--multipart-threshold", default="8MB", callback=parse_size, show_default=True, help="Files from this size are uploaded in parts"),
+        click.option("--concurrency", type=click.IntRange(1, 256), default=None, help="Parallel requests, files and parts (default: --max-workers)"),
+        click.option("--no-progress", is_flag=True, help="Don't show the live progress line"),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+# uploads every (local path, key, size) item through one shared transfer manager:
+# small files and parts of big files all share the same bounded request pool
+def upload_stream(items, bucket, config, stats):
+    from boto3.s3.transfer import create_transfer_manager
+    extra_args = {"ServerSideEncryption": "AES256"} # files encrypted in the bucket
+    if aio.enabled():
+        return aio.upload_stream(items, bucket, config, stats, extra_args)
+    with create_transfer_manager(client("s3"), config) as manager:
+        for local_path, key, _size in items:
+            manager.upload(local_path, bucket, key, extra_args=extra_args, subscribers=[stats])
+    return stats
+
+# ------------------------------------------------------------- Sync -------------------------------------------------------------
+
+MANIFEST_DIR = os.path.join(CACHE_DIR, "manifests")
+
+# the ETag S3 gives an object uploaded with this part size (plain md5 below the multipart threshold)
+def local_etag(path, chunk_size, multipart_threshold):
+    from s3transfer.utils import ChunksizeAdjuster
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size < multipart_threshold:
+            digest = hashlib.md5()
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+            return digest.hexdigest()
+        part_size = ChunksizeAdjuster().adjust_chunksize(chunk_size, size) # same adjustment s3transfer applies
+        part_digests = []
+        for part in iter(lambda: f.read(part_size), b""):
+            part_digests.append(hashlib.md5(part).digest())
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+# remote objects under prefix: key -> (size, etag), read from ListObjectsV2 pages
+def remote_objects(bucket, prefix=""):
+    return {obj["Key"]: (obj["Size"], obj["ETag"].strip('"')) for obj in iter_objects(bucket, prefix)}
+
+# local manifest (relative path -> size, mtime, etag) so unchanged files are never re-hashed
+def manifest_path(directory, bucket, prefix):
+    name = hashlib.sha1(f"{os.path.abspath(directory)}|{bucket}|{prefix}".encode()).hexdigest()
+    return os.path.join(MANIFEST_DIR, f"{name}.json")
+
+def load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# streams the files that must be uploaded; pops every local key from remote, so what's left is remote-only
+def iter_sync_changes(directory, prefix, remote, manifest, new_manifest, config, counts):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            local = os.path.join(root, file_name)
+            relative = os.path.relpath(local, directory).replace(os.sep, "/")
+            key = prefix + relative
+            st = os.stat(local)
+            known = manifest.get(relative)
+            etag = None
+            if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                etag = known["etag"]
+
+            remote_size, remote_etag = remote.pop(key, (None, None))
+            if remote_size == st.st_size:
+                if etag is None: # new or touched file: hash it once, the manifest remembers it
+                    etag = local_etag(local, config.multipart_chunksize, config.multipart_threshold)
+                    counts["hashed"] += 1
+                if etag == remote_etag:
+                    counts["unchanged"] += 1
+                    new_manifest[relative] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "etag": etag}
+                    continue
+            # uploaded now, hashed on the next sync (if it's still the same size remotely)
+            new_manifest[relative] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "etag": None}
+            counts["upload"] += 1
+            yield local, key, st.st_size
+
+def delete_keys(bucket, keys):
+    keys = list(keys)
+    for start in range(0, len(keys), 1000): # delete_objects takes up to 1000 keys
+        batch = keys[start:start + 1000]
+        s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True}
+        )
+
+# ------------------------------------------------------------- Listing and downloads -------------------------------------------------------------
+
+def parse_age(ctx, param, value): # click callback: "30m", "12h", "7d", "2w" -> seconds
+    if value is None:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 24 * 3600, "w": 7 * 24 * 3600}
+    text = value.strip().lower()
+    try:
+        if text[-1:] in units:
+            return float(text[:-1]) * units[text[-1]]
+        return float(text)
+    except ValueError:
+        raise click.BadParameter(f"Invalid age: {value} (use e.g. 30m, 12h, 7d)")
+
+# ListObjectsV2 page by page (constant memory): object dicts, plus {"Prefix": ...} "directories" with a delimiter
+def iter_objects(bucket, prefix="", delimiter=None):
+    kwargs = {"Bucket": bucket, "Prefix": prefix}
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    for page in s3_client.get_paginator("list_objects_v2").paginate(**kwargs):
+        yield from page.get("CommonPrefixes", [])
+        yield from page.get("Contents", [])
+
+class ChecksumMismatch(Exception):
+    """Raised when the downloaded bytes don't match the object's ETag"""
+
+# part size of a multipart upload ("<md5>-<parts>" ETag): part 1's size from S3, else the size
+# s3transfer/aws cli would use with chunk_size. None when neither gives that many parts
+def multipart_part_size(bucket, key, size, parts, chunk_size):
+    from s3transfer.utils import ChunksizeAdjuster
+    try:
+        first_part = s3_client.head_object(Bucket=bucket, Key=key, PartNumber=1)["ContentLength"]
+    except ClientError:
+        first_part = None
+    for part_size in (first_part, ChunksizeAdjuster().adjust_chunksize(chunk_size, size)):
+        if part_size and part_size < size and -(-size // part_size) == parts: # every part but the last is part_size
+            return part_size
+    return None
+
+class ObjectDownload:
+    """One object: a preallocated temp file mapped in memory, filled by ranged GETs from many threads
+    and checked against the ETag. Also the "future" TransferStats gets (meta.call_args.key, result())"""
+    def __init__(self, bucket, obj, path, chunk_size, stats):
+        self.bucket = bucket
+        self.key = obj["Key"]
+        self.etag = obj["ETag"].strip('"')
+        self.size = obj["Size"]
+        self.path = path
+        self.tmp_path = path + ".annaws-download"
+        self.stats = stats
+        self.meta = SimpleNamespace(call_args=SimpleNamespace(key=self.key))
+        self.error = None
+
+        # multipart: one range per part, the part md5s rebuild the ETag. single part: the md5 of the whole
+        # object, streamed with one GET or computed over the file once parallel ranges are done
+        self.verify = "whole"
+        range_size = chunk_size
+        if "-" in self.etag:
+            part_size = multipart_part_size(bucket, self.key, self.size, int(self.etag.split("-")[1]), chunk_size)
+            self.verify = "parts" if part_size else None # unknown part layout: not verified
+            range_size = part_size or chunk_size
+        self.ranges = [(start, min(start + range_size, self.size) - 1) for start in range(0, self.size, range_size)]
+        self.digests = [None] * len(self.ranges)
+        self._left = len(self.ranges)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(self.tmp_path, "w+b")
+        self._file.truncate(self.size) # preallocated, every range writes to its own slice
+        self._map = mmap.mmap(self._file.fileno(), self.size) if self.size else None
+        stats.on_queued(self)
+        if not self.ranges: # empty object
+            self._finish()
+
+    # one ranged GET streamed into the mapped file (runs on a transfer thread)
+    def fetch(self, index):
+        start, end = self.ranges[index]
+        try:
+            if self.error is None:
+                self.stats.on_progress(self, 0) # the file's latency starts with its first GET
+                response = s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}",
+                                                IfMatch=f'"{self.etag}"') # fails if the object changes meanwhile
+                if response.get("ServerSideEncryption", "").startswith("aws:kms") or response.get("SSECustomerAlgorithm"):
+                    self.verify = None # ETags of KMS / customer key encrypted objects aren't md5s
+                digest = hashlib.md5()
+                position = start
+                for chunk in response["Body"].iter_chunks(1024 * 1024):
+                    self._map[position:position + len(chunk)] = chunk
+                    digest.update(chunk)
+                    position += len(chunk)
+                    self.stats.on_progress(self, len(chunk))
+                if position != end + 1:
+                    raise IOError(f"short read: bytes {start}-{end} ended at {position}")
+                self.digests[index] = digest.digest()
+        except Exception as e:
+            self.error = self.error or e
+        with self._lock:
+            self._left -= 1
+            finished = self._left == 0
+        if finished:
+            self._finish()
+
+    def _check(self):
+        if self.verify == "parts":
+            actual = f"{hashlib.md5(b''.join(self.digests)).hexdigest()}-{len(self.digests)}"
+        elif len(self.digests) == 1:
+            actual = self.digests[0].hex()
+        else: # ranges arrived in any order, the whole-object md5 is one pass over the file
+            digest = hashlib.md5()
+            for start in range(0, self.size, 8 * 1024 * 1024):
+                digest.update(self._map[start:start + 8 * 1024 * 1024])
+            actual = digest.hexdigest()
+        if actual != self.etag:
+            raise ChecksumMismatch(f"checksum mismatch, ETag {self.etag} but downloaded {actual}")
+
+    def _finish(self):
+        try:
+            if self.error is None and self.verify:
+                self._check()
+        except ChecksumMismatch as e:
+            self.error = e
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+        self._file.close()
+        if self.error:
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, self.path) # complete files only, never a half written one
+        self.stats.on_done(self)
+
+    def result(self):
+        if self.error:
+            raise self.error
+
+# local path of key under directory, None for folder markers and keys escaping directory. Like
+# aws s3 cp --recursive, only the prefix up to its last "/" is removed: with --prefix site, site/a.txt
+# and site-old/a.txt stay apart, with --prefix site/ (or one key, site/a.txt) they land as a.txt
+def download_path(directory, prefix, key):
+    relative = key[prefix.rfind("/") + 1:].lstrip("/")
+    if not relative or key.endswith("/"):
+        return None
+    path = os.path.normpath(os.path.join(directory, relative))
+    if os.path.commonpath([os.path.abspath(directory), os.path.abspath(path)]) != os.path.abspath(directory):
+        return None
+    return path
+
+# downloads every (object, local path) on one thread pool: ranges of every file share the workers,
+# and at most a few ranges per worker are queued so listing and memory stay bounded
+def download_stream(items, bucket, chunk_size, concurrency, stats):
+    workers = concurrency or max_workers()
+    slots = threading.BoundedSemaphore(workers * 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for obj, path in items:
+            try:
+                download = ObjectDownload(bucket, obj, path, chunk_size, stats)
+            except OSError as e: # local path not writable, disk full...
+                click.echo(f"Skipping {obj['Key']}: {e}", err=True)
+                continue
+            for index in range(len(download.ranges)):
+                slots.acquire()
+                pool.submit(download.fetch, index).add_done_callback(lambda future: slots.release())
+    return stats
 
 @click.group()
 def s3():
@@ -39,6 +519,7 @@ def create(name, public):
     s3_args = {"Bucket": bucket_name}     
     
     # for creating s3 bucket outide us-east-1 AZ
+    region = get_region()
     if region != "us-east-1":
         s3_args["CreateBucketConfiguration"]={"LocationConstraint": region}
 
@@ -48,8 +529,9 @@ def create(name, public):
     # apply tags 
     s3_client.put_bucket_tagging(
         Bucket = bucket_name,
-        Tagging={"TagSet": TAGS}
+        Tagging={"TagSet": get_tags()}
     )
+    inventory.add("s3", bucket_name, {"Name": bucket_name, "Region": region})
 
     if public:
         if click.confirm("Are you sur you want to make this bucket PUBLIC?"):
@@ -103,38 +585,157 @@ def create(name, public):
 # ------------------------------------------------------------- annaws s3 upload_files -------------------------------------------------------------
             
 @s3.command()
-@click.argument("files") # local file path
+@click.argument("files", nargs=-1, required=True) # local files, directories or glob patterns
 @click.argument("bucket")
-@click.option("--key", default=None, help="path inside bucket(defaults to filename)") #remote path in the s3 bucket
-def upload_files(files, bucket, key):
-    """Upload files to annaws-cli created bucket"""
+@click.option("--key", default=None, help="path inside bucket(defaults to filename), a key prefix when uploading several files/directories") #remote path in the s3 bucket
+@transfer_options
+def upload_files(files, bucket, key, chunk_size, multipart_threshold, concurrency, no_progress):
+    """Upload files, directories or globs to annaws-cli created bucket"""
     # check if bucket exists and was created by annaws
-    annaws_buckets = []
-    for b in anna_s3_buckets():
-        annaws_buckets.append(b.name)
-    if bucket not in annaws_buckets:
+    if not annaws_bucket_region(bucket):
         click.echo(f"Bucket {bucket} was not created by annaws-cli")
         return
 
-    # key gets file_names base-name if wasn't given
-    if key is None:
-        key = os.path.basename(files)
+    config = transfer_config(chunk_size, multipart_threshold, concurrency)
+    stats = TransferStats(show_progress=not no_progress)
+    upload_stream(iter_upload_files(files, key), bucket, config, stats)
 
-    # upload the file
-    s3_client.upload_file(
-        Filename = files,
-        Bucket = bucket,
-        Key = key,
-        ExtraArgs={"ServerSideEncryption": "AES256"} # files encrypted in the bucket
-    )
-    click.echo(f"{files} was uploaded to {bucket}/{key}")    
+    stats.summary()
+    if stats.files == 1 and not stats.errors and len(files) == 1 and os.path.isfile(files[0]):
+        click.echo(f"{files[0]} was uploaded to {bucket}/{key or os.path.basename(files[0])}")
+
+# ------------------------------------------------------------- annaws s3 sync -------------------------------------------------------------
+
+@s3.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.argument("bucket")
+@click.option("--prefix", default="", help="Key prefix inside the bucket (defaults to the bucket root)")
+@click.option("--delete", is_flag=True, help="Delete objects under the prefix that don't exist locally")
+@click.option("--dry-run", is_flag=True, help="Only show what would be uploaded/deleted")
+@transfer_options
+def sync(directory, bucket, prefix, delete, dry_run, chunk_size, multipart_threshold, concurrency, no_progress):
+    """Upload only new/changed files of a directory to annaws-cli created bucket"""
+    if not annaws_bucket_region(bucket):
+        click.echo(f"Bucket {bucket} was not created by annaws-cli")
+        return
+    prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    config = transfer_config(chunk_size, multipart_threshold, concurrency)
+    remote = remote_objects(bucket, prefix)
+    path = manifest_path(directory, bucket, prefix)
+    manifest = load_manifest(path)
+    new_manifest = {}
+    counts = {"upload": 0, "unchanged": 0, "hashed": 0}
+    changes = iter_sync_changes(directory, prefix, remote, manifest, new_manifest, config, counts)
+
+    if dry_run:
+        for local, key, size in changes:
+            click.echo(f"upload: {local} -> {bucket}/{key} ({human_size(size)})")
+        if delete:
+            for key in sorted(remote):
+                click.echo(f"delete: {bucket}/{key}")
+        click.echo(f"{counts['upload']} to upload, {counts['unchanged']} unchanged, {len(remote) if delete else 0} to delete")
+        return
+
+    stats = TransferStats(show_progress=not no_progress)
+    upload_stream(changes, bucket, config, stats)
+    stats.summary()
+    if delete and remote:
+        delete_keys(bucket, sorted(remote))
+    try:
+        write_json_atomic(path, new_manifest)
+    except OSError as e:
+        click.echo(f"Warning: couldn't save sync manifest: {e}", err=True)
+    click.echo(f"{counts['upload']} uploaded, {counts['unchanged']} unchanged ({counts['hashed']} hashed), "
+               f"{len(remote) if delete else 0} deleted")
+
+# ------------------------------------------------------------- annaws s3 ls -------------------------------------------------------------
+
+@s3.command(name="ls")
+@click.argument("bucket")
+@click.argument("prefix", default="")
+@click.option("--recursive", is_flag=True, help="Every key under the prefix, not only one level")
+@click.option("--min-size", default=None, callback=parse_size, help="Only objects at least this big, e.g. 1MB")
+@click.option("--max-size", default=None, callback=parse_size, help="Only objects at most this big")
+@click.option("--older-than", default=None, callback=parse_age, help="Only objects last modified before this age, e.g. 7d, 12h")
+@click.option("--newer-than", default=None, callback=parse_age, help="Only objects modified within this age")
+def ls(bucket, prefix, recursive, min_size, max_size, older_than, newer_than):
+    """Stream the objects of an annaws-cli created bucket, with totals"""
+    if not annaws_bucket_region(bucket):
+        click.echo(f"Bucket {bucket} was not created by annaws-cli")
+        return
+    now = datetime.now(timezone.utc)
+    count = total = 0
+    for item in iter_objects(bucket, prefix, None if recursive else "/"):
+        if "Key" not in item:
+            click.echo(f"{'PRE':>30}  {item['Prefix']}")
+            continue
+        age = (now - item["LastModified"]).total_seconds()
+        if (min_size is not None and item["Size"] < min_size) or (max_size is not None and item["Size"] > max_size):
+            continue
+        if (older_than is not None and age < older_than) or (newer_than is not None and age > newer_than):
+            continue
+        count += 1
+        total += item["Size"]
+        click.echo(f"{item['LastModified']:%Y-%m-%d %H:%M:%S}  {human_size(item['Size']):>10}  {item['Key']}")
+    click.echo(f"Total: {count} objects, {human_size(total)} ({total} bytes)")
+
+# ------------------------------------------------------------- annaws s3 download -------------------------------------------------------------
+
+@s3.command()
+@click.argument("bucket")
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--prefix", default="", help="Only keys under this prefix, or one key (the prefix up to its last / isn't part of the local paths)")
+@click.option("--chunk-size", default="8MB", callback=parse_size, show_default=True, help="Ranged GET size (multipart objects are fetched part by part)")
+@click.option("--concurrency", type=click.IntRange(1, 256), default=None, help="Parallel ranged GETs across all files (default: --max-workers)")
+@click.option("--no-progress", is_flag=True, help="Don't show the live progress line")
+def download(bucket, directory, prefix, chunk_size, concurrency, no_progress):
+    """Download objects of an annaws-cli created bucket (parallel ranged GETs, ETags checked)"""
+    if not annaws_bucket_region(bucket):
+        click.echo(f"Bucket {bucket} was not created by annaws-cli")
+        return
+
+    def items():
+        paths = set() # keys that normalize to the same local path (a//b, a/./b) would overwrite each other
+        for obj in iter_objects(bucket, prefix):
+            path = download_path(directory, prefix, obj["Key"])
+            if path is None:
+                click.echo(f"Skipping {obj['Key']}", err=True)
+                continue
+            if path in paths:
+                click.echo(f"Skipping {obj['Key']}: an earlier key is already saved as {path}", err=True)
+                continue
+            paths.add(path)
+            yield obj, path
+
+    stats = TransferStats(verb="Downloaded", show_progress=not no_progress)
+    download_stream(items(), bucket, chunk_size, concurrency, stats)
+    stats.summary()
 
 # ------------------------------------------------------------- annaws s3 list -------------------------------------------------------------
 
 @s3.command(name="list")
-def list_s3():
+@click.option("--workers", type=click.IntRange(1, 512), default=None, help="Parallel bucket tag lookups (default: --max-workers)")
+@click.option("--owner-prefix", is_flag=True, help="Only check buckets named '<your aws username>-...' (faster on big accounts)")
+@regions_option
+def list_s3(workers, owner_prefix, regions):
     """List all annaws-cli created buckets"""
-    annaws_buckets = anna_s3_buckets()
+    if regions: # every region at once, one ListBuckets each; buckets come out by region, then name
+        indexed = inventory.owned("s3")
+        owned_names = None if indexed is None else {b["Name"] for b in indexed}
+        prefix = f"{get_owner()}-" if owner_prefix else None
+        found = False
+        for region, names, error in for_regions(target_regions(regions), lambda: region_bucket_names(owned_names, workers, prefix)):
+            if error:
+                click.echo(f"{region}: skipped, {error}", err=True)
+                continue
+            for name in sorted(names):
+                click.echo(f"{name}  ({region})")
+                found = True
+        if not found:
+            click.echo("No annaws-cli buckets found")
+        return
+    annaws_buckets = anna_s3_buckets(workers=workers, owner_prefix=owner_prefix)
     if not annaws_buckets:
         click.echo("No annaws-cli buckets found")
         return
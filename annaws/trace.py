@@ -0,0 +1,100 @@
+import click, json, os, threading, time
+
+# ------------------------------------------------------------- API call tracing -------------------------------------------------------------
+# records every AWS API call through botocore's event system (--trace / --profile-calls):
+# service, operation, latency (retries included), retries, bytes sent/received, thread
+
+class CallRecorder:
+    """Collects one record per API call from the botocore events of every client of the session"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def attach(self, session): # called for every new boto3 session, before its clients are created
+        session.events.register("before-call", self._before_call)
+        session.events.register("request-created", self._request_created)
+        session.events.register("after-call", self._after_call)
+        session.events.register("after-call-error", self._after_call_error)
+
+    def _before_call(self, model, context, **kwargs):
+        context["annaws_trace"] = {
+            "service": model.service_model.service_name,
+            "operation": model.name,
+            "start": time.perf_counter(),
+            "thread": threading.get_ident(),
+            "sent": 0,
+        }
+
+    def _request_created(self, request, **kwargs): # once per attempt, request.context is the call's context
+        call = getattr(request, "context", {}).get("annaws_trace")
+        if call is None:
+            return
+        from botocore.utils import determine_content_length
+        decoded = request.headers.get("X-Amz-Decoded-Content-Length") # aws-chunked (checksummed) uploads
+        call["sent"] = int(decoded) if decoded else determine_content_length(request.body) or 0
+
+    def _record(self, context, error, retries, received):
+        call = context.pop("annaws_trace", None)
+        if call is None:
+            return
+        call.update(end=time.perf_counter(), error=error, retries=retries, received=received)
+        with self._lock:
+            self.calls.append(call)
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        metadata = parsed.get("ResponseMetadata", {})
+        error = parsed.get("Error", {}).get("Code") if http_response.status_code >= 300 else None
+        received = int(http_response.headers.get("content-length", 0) or 0)
+        if not received and not model.has_streaming_output: # body already read by the parser (botocore and aiobotocore responses)
+            received = len(getattr(http_response, "_content", None) or b"")
+        self._record(context, error, metadata.get("RetryAttempts", 0), received)
+
+    def _after_call_error(self, exception, context, **kwargs):
+        self._record(context, type(exception).__name__, 0, 0)
+
+    # ---------------------------------------------------------- reports ----------------------------------------------------------
+
+    def summary(self): # per operation: calls, errors, retries, total/avg/max ms, bytes
+        rows = {}
+        for call in self.calls:
+            row = rows.setdefault(f"{call['service']}.{call['operation']}",
+                                  {"calls": 0, "errors": 0, "retries": 0, "total": 0.0, "max": 0.0, "sent": 0, "received": 0})
+            latency = call["end"] - call["start"]
+            row["calls"] += 1
+            row["errors"] += 1 if call["error"] else 0
+            row["retries"] += call["retries"]
+            row["total"] += latency
+            row["max"] = max(row["max"], latency)
+            row["sent"] += call["sent"]
+            row["received"] += call["received"]
+        return dict(sorted(rows.items(), key=lambda item: item[1]["total"], reverse=True))
+
+    def echo_summary(self):
+        rows = self.summary()
+        elapsed = time.perf_counter() - self.start
+        line = "{:<42} {:>6} {:>6} {:>7} {:>10} {:>9} {:>9} {:>10} {:>10}"
+        click.echo(f"\nAPI calls: {len(self.calls)} in {elapsed:.2f}s", err=True)
+        if not rows:
+            return
+        click.echo(line.format("OPERATION", "CALLS", "ERRORS", "RETRIES", "TOTAL ms", "AVG ms", "MAX ms", "SENT", "RECEIVED"), err=True)
+        for name, row in rows.items():
+            click.echo(line.format(
+                name, row["calls"], row["errors"], row["retries"],
+                f"{row['total'] * 1000:.0f}", f"{row['total'] / row['calls'] * 1000:.1f}", f"{row['max'] * 1000:.0f}",
+                row["sent"], row["received"]
+            ), err=True)
+
+    def write_chrome_trace(self, path): # open in chrome://tracing or https://ui.perfetto.dev
+        events = [{
+            "name": f"{call['service']}.{call['operation']}",
+            "cat": call["service"],
+            "ph": "X",
+            "ts": (call["start"] - self.start) * 1e6,
+            "dur": (call["end"] - call["start"]) * 1e6,
+            "pid": os.getpid(),
+            "tid": call["thread"],
+            "args": {"error": call["error"], "retries": call["retries"], "sent": call["sent"], "received": call["received"]},
+        } for call in self.calls]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
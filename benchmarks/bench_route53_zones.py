@@ -0,0 +1,122 @@
+"""Benchmark annaws_route53() against a local Route53 stub with N hosted zones.
+
+    python benchmarks/bench_route53_zones.py [--zones 1000] [--latency 0.02] [--workers 1,4,8]
+
+The stub sleeps --latency seconds per call. "per-zone serial" is the previous algorithm
+(one list_tags_for_resource call per zone, first list_hosted_zones page only) kept here
+as the reference. Every annaws_route53() run must find exactly the zones tagged
+CreatedBy=annaws-cli, which also checks that tags don't leak from one zone to the next.
+"""
+import argparse, os, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["HOME"] = tempfile.mkdtemp(prefix="annaws-bench-") # the stub zones must not reach the real ~/.annaws (inventory, cache)
+
+from annaws import globals as g, inventory
+from annaws import route53
+
+PAGE_SIZE = 100 # list_hosted_zones default page size
+
+class StubRoute53:
+    """In-memory stand-in for the route53 client calls used by the zone scan"""
+    def __init__(self, zone_count, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.zones = []
+        self.tags = {}
+        for n in range(zone_count):
+            zone_id = f"Z{n:08d}"
+            self.zones.append({
+                "Id": f"/hostedzone/{zone_id}", "Name": f"zone{n}.example.com.",
+                "Config": {"PrivateZone": False, "Comment": ""}, "ResourceRecordSetCount": 2
+            })
+            # every 4th zone is annaws', the others are untagged or belong to someone else
+            self.tags[zone_id] = ({"CreatedBy": "annaws-cli"} if n % 4 == 0 else {} if n % 4 == 1 else {"Team": "other"})
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def list_hosted_zones(self, Marker=None):
+        self._call()
+        start = int(Marker) if Marker else 0
+        page = {"HostedZones": self.zones[start:start + PAGE_SIZE], "IsTruncated": start + PAGE_SIZE < len(self.zones)}
+        if page["IsTruncated"]:
+            page["NextMarker"] = str(start + PAGE_SIZE)
+        return page
+
+    def get_paginator(self, operation):
+        stub = self
+        class Paginator:
+            def paginate(self):
+                marker = None
+                while True:
+                    page = stub.list_hosted_zones(Marker=marker)
+                    yield page
+                    if not page["IsTruncated"]:
+                        return
+                    marker = page["NextMarker"]
+        return Paginator()
+
+    def _tag_list(self, zone_id):
+        return [{"Key": k, "Value": v} for k, v in self.tags[zone_id].items()]
+
+    def list_tags_for_resource(self, ResourceType, ResourceId):
+        self._call()
+        return {"ResourceTagSet": {"ResourceId": ResourceId, "Tags": self._tag_list(ResourceId)}}
+
+    def list_tags_for_resources(self, ResourceType, ResourceIds):
+        assert len(ResourceIds) <= 10
+        self._call()
+        return {"ResourceTagSets": [{"ResourceId": z, "Tags": self._tag_list(z)} for z in ResourceIds]}
+
+# the previous implementation: first page only, one call per zone, one tag dict shared by all zones
+def per_zone_serial(stub):
+    zones = stub.list_hosted_zones()["HostedZones"]
+    found = []
+    zone_tags_dict = {}
+    for zone in zones:
+        zone_id = zone["Id"].split("/")[-1]
+        for tag in stub.list_tags_for_resource(ResourceType="hostedzone", ResourceId=zone_id)["ResourceTagSet"]["Tags"]:
+            zone_tags_dict[tag["Key"]] = tag["Value"]
+        if zone_tags_dict.get("CreatedBy") == "annaws-cli":
+            found.append(zone_id)
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--zones", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stubbed call")
+    parser.add_argument("--workers", default="1,4,8")
+    args = parser.parse_args()
+
+    stub = StubRoute53(args.zones, args.latency)
+    inventory.configure(fresh=True) # every worker count scans, none answers from the inventory the previous one wrote
+    g.set_client("route53", stub) # the lazy route53_client resolves to the stub
+    expected = [z["Id"].split("/")[-1] for n, z in enumerate(stub.zones) if n % 4 == 0]
+
+    print(f"annaws_route53: {args.zones} zones, {args.latency * 1000:.0f} ms per call")
+    start = time.perf_counter()
+    legacy = per_zone_serial(stub)
+    print(f"  per-zone serial   {time.perf_counter() - start:7.2f} s  calls={stub.calls:<5} "
+          f"found={len(legacy)} (expected {len(expected)})")
+
+    failed = False
+    for workers in [int(w) for w in args.workers.split(",")]:
+        stub.calls = 0
+        start = time.perf_counter()
+        found = [z["Id"] for z in route53.annaws_route53(workers=workers)]
+        elapsed = time.perf_counter() - start
+        status = "ok" if found == expected else "MISMATCH"
+        failed = failed or found != expected
+        print(f"  workers={workers:<3}       {elapsed:7.2f} s  calls={stub.calls:<5} found={len(found)}  {status}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark anna_s3_buckets() against a local S3 stub with N buckets.
+
+    python benchmarks/bench_s3_scan.py [--buckets 500] [--latency 0.02] [--workers 1,4,16,32]
+
+The stub answers list_buckets/get_bucket_tagging from memory after sleeping --latency
+seconds per call, so wall time is dominated by request latency like on a real account.
+Every worker count must return exactly the same buckets as the serial scan (workers=1).
+"""
+import argparse, os, random, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["HOME"] = tempfile.mkdtemp(prefix="annaws-bench-") # the stub buckets must not reach the real ~/.annaws (inventory, cache)
+
+from botocore.exceptions import ClientError
+from annaws import globals as g, inventory
+from annaws import s3
+
+class StubS3:
+    """In-memory stand-in for the s3 client calls used by the tag scan"""
+    def __init__(self, buckets, latency, throttle_rate):
+        self.buckets = buckets # name -> tag dict (None = no tags)
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def can_paginate(self, operation):
+        return False
+
+    def list_buckets(self):
+        self._call()
+        return {"Buckets": [{"Name": name} for name in self.buckets]}
+
+    def get_bucket_tagging(self, Bucket):
+        self._call()
+        if random.random() < self.throttle_rate:
+            raise ClientError({"Error": {"Code": "SlowDown", "Message": "stub throttle"}}, "GetBucketTagging")
+        tags = self.buckets[Bucket]
+        if tags is None:
+            raise ClientError({"Error": {"Code": "NoSuchTagSet", "Message": "no tags"}}, "GetBucketTagging")
+        return {"TagSet": [{"Key": k, "Value": v} for k, v in tags.items()]}
+
+def make_buckets(count):
+    buckets = {}
+    for n in range(count):
+        if n % 3 == 0:
+            buckets[f"bench-annaws-{n}"] = {"CreatedBy": "annaws-cli", "Owner": "bench"}
+        elif n % 3 == 1:
+            buckets[f"other-team-{n}"] = {"Team": "other"}
+        else:
+            buckets[f"untagged-{n}"] = None
+    return buckets
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buckets", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stubbed call")
+    parser.add_argument("--workers", default="1,4,16,32")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of tag calls answered with SlowDown")
+    args = parser.parse_args()
+
+    stub = StubS3(make_buckets(args.buckets), args.latency, args.throttle_rate)
+    inventory.configure(fresh=True) # every worker count scans, none answers from the inventory the previous one wrote
+    g.set_client("s3", stub) # the lazy s3_client resolves to the stub
+
+    print(f"anna_s3_buckets: {args.buckets} buckets, {args.latency * 1000:.0f} ms per call")
+    expected = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        stub.calls = 0
+        start = time.perf_counter()
+        names = [b.name for b in s3.anna_s3_buckets(workers=workers)]
+        elapsed = time.perf_counter() - start
+        if expected is None:
+            expected = names
+        status = "ok" if names == expected else "MISMATCH"
+        print(f"  workers={workers:<3} {elapsed:7.2f} s  calls={stub.calls:<6} found={len(names)}  {status}")
+        if names != expected:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Startup benchmark: time `annaws --help` in a fresh interpreter and count network calls.
+
+    python benchmarks/bench_startup.py [--runs 10]
+
+Every run is a new python process (nothing cached in sys.modules). Inside it, socket
+connects and botocore API calls are counted, so the report proves that --help makes
+zero network calls and never builds a boto3 client.
+"""
+import argparse, json, os, socket, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child():
+    calls = {"connect": 0}
+    real_connect = socket.socket.connect
+    def counting_connect(self, *args, **kwargs):
+        calls["connect"] += 1
+        return real_connect(self, *args, **kwargs)
+    socket.socket.connect = counting_connect
+
+    start = time.perf_counter()
+    from annaws.cli import cli
+    imported = time.perf_counter()
+    try:
+        cli(["--help"], prog_name="annaws", standalone_mode=False)
+    except SystemExit:
+        pass
+    done = time.perf_counter()
+
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "total_ms": (done - start) * 1000,
+        "connects": calls["connect"],
+        "boto3_loaded": "boto3" in sys.modules,
+        "client_built": "botocore.client" in sys.modules, # only loaded once a client is built
+    }), file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        results.append(json.loads(proc.stderr.strip().splitlines()[-1]))
+
+    print(f"annaws --help, {args.runs} fresh processes")
+    print(f"  import annaws.cli: median {statistics.median(r['import_ms'] for r in results):.1f} ms")
+    print(f"  import + --help:   median {statistics.median(r['total_ms'] for r in results):.1f} ms")
+    print(f"  network connects:  {sum(r['connects'] for r in results)}")
+    print(f"  boto3 imported:    {any(r['boto3_loaded'] for r in results)}")
+    print(f"  clients created:   {any(r['client_built'] for r in results)}")
+    if any(r["connects"] or r["client_built"] for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        sys.path.insert(0, ROOT)
+        child()
+    else:
+        main()
@@ -0,0 +1,320 @@
+"""Offline benchmark suite: runs annaws commands in-process against moto (no AWS account).
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/suite.py [--sizes 10,100] [--latency 0.01] [--only s3-list,ec2-list]
+    python benchmarks/suite.py --update-baseline      # store the numbers in benchmarks/baseline.json
+
+Every scenario seeds a fresh moto account with N resources, then runs one command through
+click's CliRunner. Every command that calls AWS has a scenario; inventory list, jobs list and
+jobs clear only read the local sqlite files, so they aren't timed. --latency sleeps before every API call to look like a real network.
+Reported per command and size: wall time, API calls (from annaws' own --trace recorder)
+and peak python memory (tracemalloc). Rows are compared with the stored baseline and a
+regression fails the run: more API calls than the baseline, or wall time above it by more
+than --tolerance.
+"""
+import argparse, json, os, sys, tempfile, time, tracemalloc
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+sys.path.insert(0, ROOT)
+
+# moto needs fake credentials, and the cache/manifests must not touch the real home directory
+WORKDIR = tempfile.mkdtemp(prefix="annaws-bench-")
+os.environ.update(AWS_ACCESS_KEY_ID="bench", AWS_SECRET_ACCESS_KEY="bench", AWS_DEFAULT_REGION="us-east-1",
+                  HOME=WORKDIR, ANNAWS_CONFIG=os.path.join(WORKDIR, "none.toml"))
+open(os.environ["ANNAWS_CONFIG"], "w").close() # an empty settings file: an explicit --config/ANNAWS_CONFIG must exist
+
+import boto3, botocore.handlers
+from click.testing import CliRunner
+from moto import mock_aws
+from annaws import cache, globals as g, inventory, jobs, s3
+from annaws.cli import cli
+from annaws.trace import CallRecorder
+
+TAGS = [{"Key": "CreatedBy", "Value": "annaws-cli"}, {"Key": "Owner", "Value": "bench"}]
+REGION = "us-east-1"
+
+# ------------------------------------------------------------- Seeding -------------------------------------------------------------
+# each seed creates n resources (plus some that aren't annaws') and returns the command to time
+
+def seed_ec2_list(n):
+    ec2 = boto3.client("ec2", region_name=REGION)
+    ami = ec2.describe_images()["Images"][0]["ImageId"]
+    for os_name in ("ubuntu", "amazon-linux"): # warm AMI cache, as on any repeated run
+        cache.cached(g._cache_scope() + ("ssm", ami_path(os_name)), lambda: ami, cache.AMI_TTL)
+    ec2.run_instances(ImageId=ami, MinCount=n, MaxCount=n, InstanceType="t3.micro",
+                      TagSpecifications=[{"ResourceType": "instance", "Tags": TAGS + [{"Key": "Name", "Value": "web"}]}])
+    ec2.run_instances(ImageId=ami, MinCount=n, MaxCount=n, InstanceType="t3.micro")
+    return ["ec2", "list", "--output", "table"]
+
+def seed_ec2_list_regions(n): # n instances in each of 4 regions, listed at once
+    regions = ["eu-west-1", "us-east-1", "us-west-2", "ap-southeast-2"]
+    for region in regions:
+        ec2 = boto3.client("ec2", region_name=region)
+        ami = ec2.describe_images()["Images"][0]["ImageId"]
+        with g.in_region(region):
+            for os_name in ("ubuntu", "amazon-linux"):
+                cache.cached(g._cache_scope() + ("ssm", ami_path(os_name)), lambda: ami, cache.AMI_TTL)
+        ec2.run_instances(ImageId=ami, MinCount=n, MaxCount=n, InstanceType="t3.micro",
+                          TagSpecifications=[{"ResourceType": "instance", "Tags": TAGS + [{"Key": "Name", "Value": "web"}]}])
+    return ["ec2", "list", "--regions", ",".join(regions), "--output", "table"]
+
+def seed_ec2_stop(n):
+    seed_ec2_list(n)
+    return ["ec2", "manage", "stop", "--name", "web", "--wait-interval", "0.05"]
+
+def seed_ec2_create(n): # n stopped annaws instances, then the 2 running ones create allows
+    seed_ec2_list(n)
+    run(["ec2", "manage", "stop", "--name", "web", "--no-wait"])
+    return ["ec2", "create", "t3.micro", "--amount", "2", "--wait-interval", "0.05"]
+
+def seed_jobs_watch(n): # n pending stops recorded by --no-wait, followed in one loop
+    seed_ec2_list(n)
+    run(["ec2", "manage", "stop", "--name", "web", "--no-wait"])
+    return ["jobs", "watch", "--interval", "0.05"]
+
+def seed_buckets(n):
+    client = boto3.client("s3", region_name=REGION)
+    for i in range(n):
+        name = f"bench-{i}"
+        client.create_bucket(Bucket=name)
+        if i % 3 == 0:
+            client.put_bucket_tagging(Bucket=name, Tagging={"TagSet": TAGS})
+    return "bench-0"
+
+def seed_s3_list(n):
+    seed_buckets(n)
+    return ["s3", "list"]
+
+def seed_s3_create(n): # the new bucket is checked against nothing else: n only sizes the account
+    seed_buckets(n)
+    return ["s3", "create", "--name", "bench"]
+
+def seed_objects(n):
+    bucket = seed_buckets(3)
+    client = boto3.client("s3", region_name=REGION)
+    for i in range(n):
+        client.put_object(Bucket=bucket, Key=f"data/d{i % 10}/f{i}.txt", Body=os.urandom(2048))
+    return bucket
+
+def seed_s3_ls(n):
+    return ["s3", "ls", seed_objects(n), "data/", "--recursive"]
+
+def seed_s3_download(n):
+    bucket = seed_objects(n)
+    return ["s3", "download", bucket, tempfile.mkdtemp(dir=WORKDIR), "--prefix", "data/", "--no-progress"]
+
+def local_tree(n):
+    directory = tempfile.mkdtemp(dir=WORKDIR)
+    for i in range(n):
+        sub = os.path.join(directory, f"d{i % 10}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"f{i}.txt"), "wb") as f:
+            f.write(os.urandom(2048))
+    return directory
+
+def seed_s3_upload(n):
+    bucket = seed_buckets(3)
+    return ["s3", "upload-files", local_tree(n), bucket, "--no-progress"]
+
+def seed_s3_sync_noop(n):
+    bucket = seed_buckets(3)
+    directory = local_tree(n)
+    run(["s3", "sync", directory, bucket, "--no-progress"]) # first sync uploads and writes the manifest
+    return ["s3", "sync", directory, bucket, "--no-progress"]
+
+def seed_zones(n, records=0):
+    client = boto3.client("route53", region_name=REGION)
+    zone_ids = []
+    for i in range(n):
+        zone_id = client.create_hosted_zone(Name=f"zone{i}.bench.com", CallerReference=f"bench-{i}")["HostedZone"]["Id"].split("/")[-1]
+        if i % 2 == 0:
+            client.change_tags_for_resource(ResourceType="hostedzone", ResourceId=zone_id, AddTags=TAGS)
+            zone_ids.append((zone_id, f"zone{i}.bench.com"))
+    for zone_id, zone_name in zone_ids[:1] if records else []:
+        changes = [{"Action": "CREATE", "ResourceRecordSet": {"Name": f"h{r}.{zone_name}", "Type": "A", "TTL": 60,
+                                                              "ResourceRecords": [{"Value": "10.0.0.1"}]}} for r in range(records)]
+        for start in range(0, len(changes), 500):
+            client.change_resource_record_sets(HostedZoneId=zone_id, ChangeBatch={"Changes": changes[start:start + 500]})
+    return zone_ids
+
+def seed_route53_zones(n):
+    seed_zones(n)
+    return ["route53", "list-zones"]
+
+def seed_route53_records(n):
+    seed_zones(4, records=n)
+    return ["route53", "list-records"]
+
+def write_json(name, rows):
+    path = os.path.join(WORKDIR, name)
+    with open(path, "w") as f:
+        json.dump(rows, f)
+    return path
+
+def seed_route53_plan(n):
+    zone_id, zone_name = seed_zones(1, records=n)[0]
+    desired = [{"name": f"h{r}.{zone_name}", "type": "A", "ttl": 60 if r % 10 else 120, "values": ["10.0.0.1"]} for r in range(n)]
+    return ["route53", "plan", zone_id, write_json("desired.json", desired)]
+
+def seed_route53_apply(n):
+    return ["route53", "apply"] + seed_route53_plan(n)[2:] + ["--yes"]
+
+def seed_route53_create_zones(n):
+    seed_zones(n)
+    return ["route53", "create-zones", "new.bench.com"]
+
+def seed_route53_manage_records(n):
+    zone_id, zone_name = seed_zones(1, records=n)[0]
+    return ["route53", "manage-records", "create", zone_id, "--name", f"new.{zone_name}", "--type", "A", "--value", "10.0.0.2"]
+
+def seed_route53_apply_changes(n): # n new records in 2 zones, packed in as few batches as route53 allows
+    rows = [{"action": "CREATE", "zone": zone_id, "name": f"n{r}.{zone_name}", "type": "A", "ttl": 60, "values": ["10.0.0.3"]}
+            for zone_id, zone_name in seed_zones(4) for r in range(n // 2)]
+    return ["route53", "apply-changes", write_json("changes.json", rows)]
+
+def seed_inventory_refresh(n):
+    seed_ec2_list(n)
+    seed_buckets(n)
+    seed_zones(n)
+    return ["inventory", "refresh"]
+
+def seed_destroy(n):
+    seed_ec2_list(n)
+    bucket = seed_buckets(3)
+    client = boto3.client("s3", region_name=REGION)
+    for i in range(n):
+        client.put_object(Bucket=bucket, Key=f"objects/{i}", Body=b"x")
+    seed_zones(2, records=n)
+    return ["destroy", "--yes"]
+
+def ami_path(os_name):
+    return {"ubuntu": "/aws/service/canonical/ubuntu/server/20.04/stable/current/amd64/hvm/ebs-gp2/ami-id",
+            "amazon-linux": "/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-x86_64-gp2"}[os_name]
+
+SCENARIOS = {
+    "ec2-list": seed_ec2_list,
+    "ec2-list-regions": seed_ec2_list_regions,
+    "ec2-stop": seed_ec2_stop,
+    "ec2-create": seed_ec2_create,
+    "s3-list": seed_s3_list,
+    "s3-create": seed_s3_create,
+    "s3-upload": seed_s3_upload,
+    "s3-sync-noop": seed_s3_sync_noop,
+    "s3-ls": seed_s3_ls,
+    "s3-download": seed_s3_download,
+    "route53-zones": seed_route53_zones,
+    "route53-records": seed_route53_records,
+    "route53-create-zones": seed_route53_create_zones,
+    "route53-manage-records": seed_route53_manage_records,
+    "route53-apply-changes": seed_route53_apply_changes,
+    "route53-plan": seed_route53_plan,
+    "route53-apply": seed_route53_apply,
+    "inventory-refresh": seed_inventory_refresh,
+    "jobs-watch": seed_jobs_watch,
+    "destroy": seed_destroy,
+}
+
+# ------------------------------------------------------------- Running -------------------------------------------------------------
+
+def run(argv):
+    result = CliRunner().invoke(cli, argv)
+    if result.exit_code != 0:
+        raise RuntimeError(f"annaws {' '.join(argv)} failed:\n{result.output}{result.exception!r}")
+    return result
+
+class _BuiltinEvents:
+    """Registers handlers on every new botocore session, the way moto installs itself"""
+    def __init__(self):
+        self.added = []
+
+    def register(self, event, handler):
+        self.added.append((event, handler))
+        botocore.handlers.BUILTIN_HANDLERS.append((event, handler))
+
+    def remove(self):
+        for item in self.added:
+            botocore.handlers.BUILTIN_HANDLERS.remove(item)
+
+def measure(scenario, size, latency):
+    with mock_aws():
+        g.configure(reset=True)
+        cache._entries = {}
+        s3._bucket_checks.clear()
+        for store in (inventory, jobs): # every scenario starts without a local inventory (cold scan) or jobs
+            if store._db is not None:
+                store._db.close()
+                store._db = None
+            if os.path.exists(store.DB_FILE):
+                os.remove(store.DB_FILE)
+        argv = SCENARIOS[scenario](size)
+
+        # the same recorder as --trace, plus the injected latency, on the session the cli builds
+        recorder = CallRecorder()
+        events = _BuiltinEvents()
+        recorder.attach(SimpleNamespace(events=events))
+        if latency:
+            events.register("before-call", lambda **kwargs: time.sleep(latency))
+        try:
+            tracemalloc.start()
+            start = time.perf_counter()
+            run(argv)
+            wall = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            events.remove()
+    return {"wall": round(wall, 4), "calls": len(recorder.calls), "peak_kib": peak // 1024}
+
+def compare(row, base, tolerance):
+    if not base:
+        return "new"
+    problems = []
+    if row["calls"] > base["calls"]:
+        problems.append(f"calls {base['calls']}->{row['calls']}")
+    if row["wall"] > base["wall"] * (1 + tolerance) and row["wall"] - base["wall"] > 0.05:
+        problems.append(f"wall {base['wall']:.2f}->{row['wall']:.2f}s")
+    return "REGRESSION " + ", ".join(problems) if problems else f"ok ({row['wall'] / max(base['wall'], 1e-9):.2f}x)"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100", help="resources seeded per scenario, comma separated")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added before every API call")
+    parser.add_argument("--only", default=None, help="comma separated scenarios: " + ", ".join(SCENARIOS))
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed wall time growth over the baseline (0.5 = +50%%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    scenarios = args.only.split(",") if args.only else list(SCENARIOS)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    results, regressions = {}, 0
+    line = "{:<23} {:>6} {:>9} {:>7} {:>10}  {}"
+    print(line.format("SCENARIO", "SIZE", "WALL s", "CALLS", "PEAK KiB", "VS BASELINE"))
+    for scenario in scenarios:
+        for size in sizes:
+            row = measure(scenario, size, args.latency)
+            results.setdefault(scenario, {})[str(size)] = row
+            status = compare(row, baseline.get(scenario, {}).get(str(size)), args.tolerance)
+            regressions += status.startswith("REGRESSION")
+            print(line.format(scenario, size, f"{row['wall']:.3f}", row["calls"], row["peak_kib"], status), flush=True)
+
+    if args.update_baseline:
+        for scenario, rows in results.items():
+            baseline.setdefault(scenario, {}).update(rows)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{regressions} regression/s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@ setup(
     version="0.1.0",
     packages=find_packages(),
     install_requires=["click", "boto3"],
+    extras_require={
+        "yaml": ["PyYAML"], # YAML change files (route53 apply-changes)
+        "async": ["aiobotocore"], # --engine async
+    },
     entry_points={
         "console_scripts": [
             "annaws = annaws.cli:cli", 